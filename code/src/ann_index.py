@@ -0,0 +1,121 @@
+import os
+import time
+
+import numpy as np
+
+from shared_artifacts import artifact_path, save_array, load_array
+
+
+class IVFInt8Index:
+    """
+    Inverted-file index over L2-normalised embeddings with int8 scalar-quantised vectors.
+
+    Vectors are clustered with spherical k-means; a query probes the `nprobe` closest lists,
+    scores their int8 codes, and re-ranks the best `rerank` candidates against the exact
+    float vectors (which can stay memory-mapped on disk).
+    """
+
+    def __init__(self, centroids, list_offsets, list_ids, codes, scale):
+        self.centroids = centroids
+        self.list_offsets = list_offsets
+        self.list_ids = list_ids
+        self.codes = codes
+        self.scale = scale
+
+    def __len__(self):
+        return len(self.list_ids)
+
+    @classmethod
+    def build(cls, embeddings, n_lists=None, iterations=10, train_size=100000, seed=0):
+        start = time.time()
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        n = len(embeddings)
+        n_lists = n_lists or max(1, int(np.sqrt(n)))
+        rng = np.random.default_rng(seed)
+
+        train = embeddings[rng.choice(n, size=min(n, train_size), replace=False)]
+        centroids = train[rng.choice(len(train), size=n_lists, replace=False)].copy()
+        for _ in range(iterations):
+            assignment = _assign(train, centroids)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignment, train)
+            # Keep the previous centroid for lists that lost all their members
+            empty = np.bincount(assignment, minlength=n_lists) == 0
+            centroids = np.where(empty[:, None], centroids, sums)
+            norms = np.linalg.norm(centroids, axis=1, keepdims=True)
+            norms[norms == 0] = 1
+            centroids /= norms
+
+        assignment = _assign(embeddings, centroids)
+        order = np.argsort(assignment, kind="stable")
+        counts = np.bincount(assignment, minlength=n_lists)
+        list_offsets = np.zeros(n_lists + 1, dtype=np.int64)
+        np.cumsum(counts, out=list_offsets[1:])
+
+        # Symmetric per-dimension scale so that codes * scale approximates the vector
+        scale = np.abs(embeddings).max(axis=0) / 127
+        scale[scale == 0] = 1
+        codes = np.clip(np.round(embeddings[order] / scale), -127, 127).astype(np.int8)
+
+        print(f"Built IVF index: {n} vectors, {n_lists} lists in {time.time() - start:.1f}s")
+        return cls(centroids, list_offsets, order.astype(np.int64), codes, scale.astype(np.float32))
+
+    def search(self, query, exact_embeddings, k=3, nprobe=8, rerank=50):
+        """
+        Returns (ids, scores) of the k nearest vectors to the normalised query, scored exactly.
+        """
+        query = np.asarray(query, dtype=np.float32)
+        nprobe = min(nprobe, len(self.centroids))
+        probes = np.argpartition(-(self.centroids @ query), nprobe - 1)[:nprobe]
+
+        positions = np.concatenate([
+            np.arange(self.list_offsets[c], self.list_offsets[c + 1]) for c in probes
+        ])
+        if not len(positions):
+            return np.array([], dtype=np.int64), np.array([], dtype=np.float32)
+
+        # Approximate scores straight from the int8 codes
+        approx = self.codes[positions].astype(np.float32) @ (query * self.scale)
+        rerank = min(rerank, len(positions))
+        best = np.argpartition(-approx, rerank - 1)[:rerank]
+        candidate_ids = np.sort(self.list_ids[positions[best]])
+
+        exact = np.asarray(exact_embeddings[candidate_ids], dtype=np.float32) @ query
+        k = min(k, len(candidate_ids))
+        top = np.argpartition(-exact, k - 1)[:k]
+        top = top[np.argsort(-exact[top])]
+        return candidate_ids[top], exact[top]
+
+    def save(self, directory, prefix="ann"):
+        save_array(directory, f"{prefix}.centroids", self.centroids)
+        save_array(directory, f"{prefix}.list_offsets", self.list_offsets)
+        save_array(directory, f"{prefix}.list_ids", self.list_ids)
+        save_array(directory, f"{prefix}.codes", self.codes)
+        save_array(directory, f"{prefix}.scale", self.scale)
+
+    @classmethod
+    def load(cls, name, prefix="ann"):
+        """Maps a published index read-only, or returns None if the artifact has no index."""
+        if not os.path.exists(os.path.join(artifact_path(name), f"{prefix}.codes.npy")):
+            return None
+        return cls(*(load_array(name, f"{prefix}.{key}")
+                     for key in ["centroids", "list_offsets", "list_ids", "codes", "scale"]))
+
+
+def _assign(vectors, centroids, batch_size=65536):
+    assignment = np.empty(len(vectors), dtype=np.int64)
+    for i in range(0, len(vectors), batch_size):
+        assignment[i:i + batch_size] = np.argmax(vectors[i:i + batch_size] @ centroids.T, axis=1)
+    return assignment
+
+
+def measure_recall(index, embeddings, queries, k=10, nprobe=8, rerank=50):
+    """
+    Recall@k of the index against a brute-force scan, averaged over the queries.
+    """
+    hits = 0
+    for query in queries:
+        expected = np.argpartition(-(embeddings @ query), k - 1)[:k]
+        found, _ = index.search(query, embeddings, k=k, nprobe=nprobe, rerank=rerank)
+        hits += len(np.intersect1d(expected, found))
+    return hits / (k * len(queries))
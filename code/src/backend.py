@@ -1,76 +1,306 @@
-from fastapi import FastAPI, File, UploadFile
-from typing import List
+from fastapi import FastAPI, File, UploadFile, HTTPException, Request
+from fastapi.responses import FileResponse
+from starlette.concurrency import run_in_threadpool
+from typing import List, Optional
 import uvicorn
 from entity_extractor import start
-from search_agent import chat_agent
-from neo4j import GraphDatabase
 from sentence_transformers import SentenceTransformer
 from groq import Groq
 import os
 from dotenv import load_dotenv
-import json
+import tempfile
+import threading
+import time
 
-from get_transaction_risk import compute_transaction_risk
-from llm_reasoner import llm_reasoner
+from batch_store import BatchStore
+from results_store import ResultsStore
+from profiler import should_profile, profile_request, profile_path
+from graph_db import build_driver, AsyncGraph, USE_ASYNC_GRAPH, pool_stats
+from job_queue import get_broker, RESULTS_QUEUE_NAME
+from llm_gateway import gateway, llm_priority, INTERACTIVE, BULK
+from pipeline import screen_transactions
+from ofac_risk import load_ofac_index
+from network_risk import load_node_embeddings
 
 load_dotenv()
-db_uri = "bolt://localhost:7689"
-db_user = "neo4j"
 db_password = os.environ.get('NEO4J_RISK_DB_PASSWORD')
-driver = GraphDatabase.driver(db_uri, auth=(db_user, db_password))
+driver = AsyncGraph(password=db_password) if USE_ASYNC_GRAPH else build_driver(password=db_password)
 print("Established connection with the database...")
 
 
 model = SentenceTransformer("all-MiniLM-L6-v2")
 print("Sentence transformer loaded...")
 
+# Read-only artifacts are published once per host and memory-mapped by every worker
+ofac_index = load_ofac_index("./ofac_embeddings.pkl")
+print("OFAC index mapped...")
+
+if load_node_embeddings() is not None:
+    print("Graph node embeddings mapped...")
+
 
 client = Groq(api_key=os.environ.get('GROQ_API_KEY'))
 
 app = FastAPI()
 
+UPLOAD_DIR = os.environ.get("UPLOAD_DIR", tempfile.gettempdir())
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+# Uploads up to this size get interactive LLM priority; larger ones queue behind them as bulk
+INTERACTIVE_UPLOAD_BYTES = int(os.environ.get("INTERACTIVE_UPLOAD_BYTES", 256 * 1024))
+
+
+async def save_upload(file):
+    """
+    Streams an upload to a unique temp path in fixed-size chunks and returns (path, size).
+    The extension is kept because the extractor picks its reader from it.
+    """
+    suffix = os.path.splitext(file.filename or "")[1].lower()
+    fd, path = tempfile.mkstemp(prefix="upload-", suffix=suffix, dir=UPLOAD_DIR)
+    size = 0
+    try:
+        with os.fdopen(fd, "wb") as buffer:
+            while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+                buffer.write(chunk)
+                size += len(chunk)
+    except Exception:
+        os.remove(path)
+        raise
+    finally:
+        await file.close()
+    return path, size
+
+
+batch_store = BatchStore()
+results_store = ResultsStore()
+
+# "inline" screens in this process; "queue" hands transactions to worker.py processes
+SCREENING_MODE = os.environ.get("SCREENING_MODE", "inline")
+broker = get_broker() if SCREENING_MODE == "queue" else None
+results_broker = get_broker(queue=RESULTS_QUEUE_NAME) if broker else None
+COLLECT_INTERVAL_SECONDS = float(os.environ.get("COLLECT_INTERVAL_SECONDS", 1))
+
+
+def record_result(batch_id, position, result):
+    batch_store.record_result(batch_id, position, result)
+    results_store.record(batch_id, position, result)
+
+
+def apply_outcomes(messages):
+    """
+    Writes outcomes reported by the workers to the stores and finishes batches with nothing left
+    pending. Messages are acked last, so a crash here only means they are applied again.
+    """
+    for message in messages:
+        outcome = message.payload
+        if "result" in outcome:
+            record_result(outcome["batch_id"], outcome["position"], outcome["result"])
+        else:
+            batch_store.record_failure(outcome["batch_id"], outcome["position"], outcome["error"])
+    for batch_id in {message.payload["batch_id"] for message in messages}:
+        status = batch_store.finish_if_complete(batch_id)
+        if status:
+            print(f"Batch {batch_id} {status}")
+    for message in messages:
+        results_broker.ack(message)
+
+
+def collect_outcomes():
+    while True:
+        try:
+            messages = results_broker.reserve(max_jobs=100)
+            if messages:
+                apply_outcomes(messages)
+                continue
+        except Exception as e:
+            print(f"Collecting worker outcomes failed: {e}")
+        time.sleep(COLLECT_INTERVAL_SECONDS)
+
+
+if results_broker:
+    threading.Thread(target=collect_outcomes, name="outcome-collector", daemon=True).start()
+
+
+def extract_files(batch_id):
+    """
+    Extracts the transactions of every upload in the batch that has not been fully extracted yet.
+    A failed upload is kept on disk so a resume can retry it. Records the extractor gave up on are
+    kept on the file as 'partial', and a resume extracts only those; the upload itself is deleted
+    once the rest of its transactions are in the manifest.
+    """
+    for batch_file in batch_store.unextracted_files(batch_id):
+        records = batch_file["failed_records"]
+        if records is None and not os.path.exists(batch_file["path"]):
+            batch_store.set_file_status(batch_file["file_id"], "failed", "Upload no longer available")
+            continue
+        try:
+            transactions, failed_records = start(batch_file["path"], records)
+            batch_store.add_transactions(batch_id, transactions)
+        except Exception as e:
+            print(f"Extraction failed for {batch_file['filename']}: {e}")
+            batch_store.set_file_status(batch_file["file_id"], "failed", f"{type(e).__name__}: {e}", records)
+            continue
+        if failed_records:
+            batch_store.set_file_status(batch_file["file_id"], "partial",
+                                        f"{len(failed_records)} record(s) could not be extracted", failed_records)
+        else:
+            batch_store.set_file_status(batch_file["file_id"], "extracted")
+        if os.path.exists(batch_file["path"]):
+            os.remove(batch_file["path"])
+
+
+def run_batch(batch_id):
+    """
+    Screens every transaction of a batch that has not completed yet. Each result or failure is
+    checkpointed as it happens, so one bad transaction does not fail the batch.
+    """
+    batch_store.set_status(batch_id, "running")
+    screen_transactions(
+        driver, model, ofac_index,
+        batch_store.pending_transactions(batch_id),
+        on_result=lambda position, result: record_result(batch_id, position, result),
+        on_failure=lambda position, error: batch_store.record_failure(batch_id, position, error),
+        on_evidence=lambda position, reasoner_input, annotations:
+            batch_store.record_evidence(batch_id, position, reasoner_input, annotations),
+        saved_evidence=batch_store.saved_evidence(batch_id)
+    )
+    batch_store.finish_batch(batch_id)
+    return batch_store.get_batch(batch_id)
+
+
+def enqueue_batch(batch_id, priority=INTERACTIVE, profile_id=None):
+    """
+    Queues every unfinished transaction of a batch for the workers; progress is read from /batches.
+    With a profile_id, the workers profile these jobs too and name their profiles after it.
+    """
+    batch_store.reset_failures(batch_id)
+    pending = batch_store.pending_transactions(batch_id)
+    if not pending:
+        batch_store.finish_batch(batch_id)
+        return batch_store.get_batch(batch_id)
+    # Set before enqueueing so a fast worker's final status is not overwritten
+    batch_store.set_status(batch_id, "queued")
+    broker.enqueue([
+        {"batch_id": batch_id, "position": position, "transaction": transaction, "priority": priority,
+         **({"profile_id": profile_id} if profile_id else {})}
+        for position, transaction in pending
+    ])
+    return batch_store.get_batch(batch_id)
+
+
+def screen_upload(batch_id, priority, profile_id=None):
+    """
+    The blocking part of an upload. It runs in the threadpool so that concurrent uploads overlap
+    and their LLM calls compete by priority in the gateway.
+    """
+    with llm_priority(priority):
+        extract_files(batch_id)
+        return enqueue_batch(batch_id, priority, profile_id) if broker else run_batch(batch_id)
+
+
 @app.post("/upload")
-async def upload_files(files: List[UploadFile] = File(...)):
-    file_details = []
-
-    results = []
-    for file in files:
-        content = await file.read()  # Read file content (Modify as needed)
-        file_details.append({"filename": file.filename, "size": len(content)})
-        transactions = start(file)
-        for transaction in transactions:
-            extracted_entities = []
-            for entity in transaction["Entity"]:
-                extracted_entities.append({
-                    "name": entity["Name"],
-                    "type": entity["Type"],
-                    "place": entity["Place"] if entity["Place"] else None,
-                })
-            transaction_risks = compute_transaction_risk(driver, model, extracted_entities)
-            # reasoning = extract_reasoning(client, transaction_risks)
-            print("Starting agentic web search...")
-            search_agent_response = chat_agent(transaction)
-
-            result = llm_reasoner(
-                search_agent_response,
-                transaction_risks["network_results"],
-                transaction_risks["ofac_results"],
-                transaction_risks["wiki_results"]
-            )
-
-            # result = {
-            #     "Transaction ID": transaction["Transaction ID"],
-            #     "Extracted Entity": transaction_risks["entities"],
-            #     "Entity Types": transaction_risks["entity_types"],
-            #     "Risk Score": transaction_risks["risk_score"],
-            #     "Supporting Evidence": transaction_risks["supporting_evidence"],
-            #     "Confidence Score": transaction_risks["confidence_score"],
-            #     # "reasoning": reasoning
-            # }
-            results.append(json.loads(result))
-            # print(result)
-
-    return {"message": "Files uploaded successfully!", "files": file_details, "results": results}
+async def upload_files(request: Request, files: List[UploadFile] = File(...)):
+    upload_bytes = int(request.headers.get("content-length") or 0)
+    priority = INTERACTIVE if upload_bytes <= INTERACTIVE_UPLOAD_BYTES else BULK
+    with profile_request(should_profile(request), "upload") as profile_id:
+        batch_id = batch_store.create_batch(priority)
+        for file in files:
+            file_path, size = await save_upload(file)
+            batch_store.add_file(batch_id, file.filename, size, file_path)
+        batch = await run_in_threadpool(screen_upload, batch_id, priority, profile_id)
+    response = {
+        "message": "Files uploaded successfully!",
+        "batch_id": batch_id,
+        "status": batch["status"],
+        "files": batch["files"],
+        "results": batch["results"],
+        "failures": batch["failures"]
+    }
+    if profile_id:
+        response["profile_id"] = profile_id
+    return response
+
+
+@app.get("/batches/{batch_id}")
+def get_batch(batch_id: str):
+    batch = batch_store.get_batch(batch_id)
+    if batch is None:
+        raise HTTPException(status_code=404, detail="Batch not found")
+    return batch
+
+
+@app.post("/batches/{batch_id}/resume")
+def resume_batch(batch_id: str):
+    """Re-extracts failed uploads and records and re-runs the failed and unfinished transactions of an earlier batch."""
+    batch = batch_store.get_batch(batch_id)
+    if batch is None:
+        raise HTTPException(status_code=404, detail="Batch not found")
+    if broker and batch["status"] == "queued":
+        raise HTTPException(status_code=409, detail="Batch is still queued")
+    # Re-run at the upload's priority so bulk resumes stay behind interactive work
+    return screen_upload(batch_id, batch["priority"])
+
+
+@app.get("/results/transactions")
+def list_screened_transactions(page: int = 1, page_size: int = 50, min_risk: Optional[float] = None,
+                               since: Optional[str] = None, until: Optional[str] = None,
+                               transaction_id: Optional[str] = None):
+    """Screened transactions, newest first. since/until are ISO-8601 timestamps."""
+    return results_store.list_transactions(page, page_size, min_risk, since, until, transaction_id)
+
+
+@app.get("/results/entities")
+def list_screened_entities(name: Optional[str] = None, page: int = 1, page_size: int = 50,
+                           min_risk: Optional[float] = None, since: Optional[str] = None):
+    return results_store.list_entities(name, page, page_size, min_risk, since)
+
+
+@app.get("/results/entities/{name:path}")
+def screened_entity_summary(name: str):
+    return results_store.entity_summary(name)
+
+
+@app.get("/profiles/{profile_id}")
+def get_profile_summary(profile_id: str):
+    """Top-N frames by self and inclusive time for a profiled request."""
+    return _profile_file(profile_id, "summary")
+
+
+@app.get("/profiles/{profile_id}/speedscope")
+def get_profile_speedscope(profile_id: str):
+    """Flame graph file; open it at https://www.speedscope.app."""
+    return _profile_file(profile_id, "speedscope")
+
+
+def _profile_file(profile_id, kind):
+    try:
+        path = profile_path(profile_id, kind)
+    except ValueError:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    if not os.path.exists(path):
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return FileResponse(path, media_type="application/json", filename=os.path.basename(path))
+
+
+@app.get("/metrics/graph-pool")
+def graph_pool_metrics():
+    return pool_stats.snapshot()
+
+
+@app.get("/metrics/llm-gateway")
+def llm_gateway_metrics():
+    """Queue depth by priority, wait times, retries and coalesced calls of the shared LLM gateway."""
+    return gateway.stats()
+
+
+@app.get("/metrics/queue")
+def queue_metrics():
+    if not broker:
+        raise HTTPException(status_code=404, detail="Screening queue is not enabled")
+    return {**broker.stats(), "results": results_broker.stats()}
 
 if __name__ == "__main__":
-    uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
+    workers = int(os.environ.get("UVICORN_WORKERS", 1))
+    if workers > 1:
+        uvicorn.run("backend:app", host="0.0.0.0", port=8000, workers=workers)
+    else:
+        uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
@@ -0,0 +1,261 @@
+import json
+import os
+import sqlite3
+import time
+import uuid
+from contextlib import contextmanager
+
+BATCH_DB_PATH = os.environ.get("BATCH_DB_PATH", "./batches.db")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS batches (
+    batch_id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    priority INTEGER NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS batch_transactions (
+    batch_id TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    transaction_id TEXT,
+    payload TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    result TEXT,
+    evidence TEXT,
+    error TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (batch_id, position)
+);
+CREATE INDEX IF NOT EXISTS batch_transactions_status ON batch_transactions (batch_id, status);
+CREATE TABLE IF NOT EXISTS batch_files (
+    file_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    batch_id TEXT NOT NULL,
+    filename TEXT,
+    size INTEGER,
+    path TEXT,
+    status TEXT NOT NULL DEFAULT 'pending',
+    error TEXT,
+    failed_records TEXT,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS batch_files_batch ON batch_files (batch_id, status);
+"""
+
+
+class BatchStore:
+    """
+    Checkpoints upload batches in SQLite: the extracted transactions form the batch manifest and
+    every transaction's result or error is written as soon as it completes, so an interrupted or
+    partially failed batch can be resumed without redoing finished work.
+    """
+
+    def __init__(self, db_path=BATCH_DB_PATH):
+        self.db_path = db_path
+        with self._connect() as conn:
+            conn.executescript(SCHEMA)
+            columns = {row["name"] for row in conn.execute("PRAGMA table_info(batch_transactions)")}
+            if "evidence" not in columns:
+                conn.execute("ALTER TABLE batch_transactions ADD COLUMN evidence TEXT")
+            columns = {row["name"] for row in conn.execute("PRAGMA table_info(batches)")}
+            if "priority" not in columns:
+                conn.execute("ALTER TABLE batches ADD COLUMN priority INTEGER NOT NULL DEFAULT 0")
+            columns = {row["name"] for row in conn.execute("PRAGMA table_info(batch_files)")}
+            if "failed_records" not in columns:
+                conn.execute("ALTER TABLE batch_files ADD COLUMN failed_records TEXT")
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def create_batch(self, priority=0):
+        """The LLM priority is kept with the batch so resumes run at the same priority as the upload."""
+        batch_id = uuid.uuid4().hex
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO batches (batch_id, status, priority, created_at, updated_at) "
+                "VALUES (?, 'extracting', ?, ?, ?)",
+                (batch_id, priority, now, now)
+            )
+        return batch_id
+
+    def add_transactions(self, batch_id, transactions):
+        now = time.time()
+        with self._connect() as conn:
+            start = conn.execute(
+                "SELECT COUNT(*) FROM batch_transactions WHERE batch_id = ?", (batch_id,)
+            ).fetchone()[0]
+            conn.executemany(
+                "INSERT INTO batch_transactions (batch_id, position, transaction_id, payload, updated_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                [
+                    (batch_id, start + i, str(t.get("Transaction ID")), json.dumps(t), now)
+                    for i, t in enumerate(transactions)
+                ]
+            )
+
+    def add_file(self, batch_id, filename, size, path):
+        """Registers an upload kept at `path` until its transactions are in the manifest."""
+        with self._connect() as conn:
+            return conn.execute(
+                "INSERT INTO batch_files (batch_id, filename, size, path, updated_at) VALUES (?, ?, ?, ?, ?)",
+                (batch_id, filename, size, path, time.time())
+            ).lastrowid
+
+    def set_file_status(self, file_id, status, error=None, failed_records=None):
+        """failed_records are the records of a 'partial' upload that still need extracting."""
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE batch_files SET status = ?, error = ?, failed_records = ?, updated_at = ? WHERE file_id = ?",
+                (status, error, json.dumps(failed_records) if failed_records else None, time.time(), file_id)
+            )
+
+    def unextracted_files(self, batch_id):
+        """Uploads whose extraction has not succeeded yet, so a resume can retry them."""
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT file_id, filename, path, failed_records FROM batch_files "
+                "WHERE batch_id = ? AND status != 'extracted' ORDER BY file_id",
+                (batch_id,)
+            ).fetchall()
+        return [
+            {**dict(row), "failed_records": json.loads(row["failed_records"]) if row["failed_records"] else None}
+            for row in rows
+        ]
+
+    def set_status(self, batch_id, status):
+        self._update_batch(batch_id, status=status)
+
+    def _update_batch(self, batch_id, **fields):
+        assignments = ", ".join(f"{field} = ?" for field in fields)
+        with self._connect() as conn:
+            conn.execute(
+                f"UPDATE batches SET {assignments}, updated_at = ? WHERE batch_id = ?",
+                (*fields.values(), time.time(), batch_id)
+            )
+
+    def pending_transactions(self, batch_id):
+        """Returns (position, transaction) for everything not yet completed, in upload order."""
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT position, payload FROM batch_transactions "
+                "WHERE batch_id = ? AND status != 'done' ORDER BY position",
+                (batch_id,)
+            ).fetchall()
+        return [(row["position"], json.loads(row["payload"])) for row in rows]
+
+    def record_evidence(self, batch_id, position, reasoner_input, annotations):
+        """Checkpoints the gathered evidence of a transaction that is waiting for the reasoner."""
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE batch_transactions SET evidence = ?, updated_at = ? WHERE batch_id = ? AND position = ?",
+                (json.dumps([reasoner_input, annotations]), time.time(), batch_id, position)
+            )
+
+    def saved_evidence(self, batch_id):
+        """Returns position -> (reasoner_input, annotations) for unfinished transactions with evidence."""
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT position, evidence FROM batch_transactions "
+                "WHERE batch_id = ? AND status != 'done' AND evidence IS NOT NULL",
+                (batch_id,)
+            ).fetchall()
+        return {row["position"]: tuple(json.loads(row["evidence"])) for row in rows}
+
+    def record_result(self, batch_id, position, result):
+        """A job can be delivered more than once, so a transaction that is already done is left as is."""
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE batch_transactions SET status = 'done', result = ?, error = NULL, "
+                "attempts = attempts + 1, updated_at = ? WHERE batch_id = ? AND position = ? AND status != 'done'",
+                (json.dumps(result), time.time(), batch_id, position)
+            )
+
+    def record_failure(self, batch_id, position, error):
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE batch_transactions SET status = 'failed', error = ?, "
+                "attempts = attempts + 1, updated_at = ? WHERE batch_id = ? AND position = ? AND status != 'done'",
+                (error, time.time(), batch_id, position)
+            )
+
+    def finish_batch(self, batch_id):
+        with self._connect() as conn:
+            failed = conn.execute(
+                "SELECT COUNT(*) FROM batch_transactions WHERE batch_id = ? AND status != 'done'",
+                (batch_id,)
+            ).fetchone()[0]
+            failed += conn.execute(
+                "SELECT COUNT(*) FROM batch_files WHERE batch_id = ? AND status != 'extracted'",
+                (batch_id,)
+            ).fetchone()[0]
+        status = "completed_with_errors" if failed else "completed"
+        self.set_status(batch_id, status)
+        return status
+
+    def finish_if_complete(self, batch_id):
+        """Finishes the batch once no transaction is pending; returns the status, or None if still running."""
+        with self._connect() as conn:
+            pending = conn.execute(
+                "SELECT COUNT(*) FROM batch_transactions WHERE batch_id = ? AND status = 'pending'",
+                (batch_id,)
+            ).fetchone()[0]
+        return None if pending else self.finish_batch(batch_id)
+
+    def reset_failures(self, batch_id):
+        """Marks failed transactions pending again so they can be re-queued."""
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE batch_transactions SET status = 'pending', updated_at = ? "
+                "WHERE batch_id = ? AND status = 'failed'",
+                (time.time(), batch_id)
+            )
+
+    def get_batch(self, batch_id):
+        with self._connect() as conn:
+            batch = conn.execute("SELECT * FROM batches WHERE batch_id = ?", (batch_id,)).fetchone()
+            if batch is None:
+                return None
+            rows = conn.execute(
+                "SELECT position, transaction_id, status, result, error, attempts FROM batch_transactions "
+                "WHERE batch_id = ? ORDER BY position",
+                (batch_id,)
+            ).fetchall()
+            files = conn.execute(
+                "SELECT filename, size, status, error, failed_records FROM batch_files WHERE batch_id = ? "
+                "ORDER BY file_id",
+                (batch_id,)
+            ).fetchall()
+
+        counts = {}
+        for row in rows:
+            counts[row["status"]] = counts.get(row["status"], 0) + 1
+        return {
+            "batch_id": batch_id,
+            "status": batch["status"],
+            "priority": batch["priority"],
+            "files": [
+                {**dict(row), "failed_records": json.loads(row["failed_records"]) if row["failed_records"] else []}
+                for row in files
+            ],
+            "counts": counts,
+            "results": [json.loads(row["result"]) for row in rows if row["status"] == "done"],
+            "failures": [
+                {
+                    "position": row["position"],
+                    "transaction_id": row["transaction_id"],
+                    "error": row["error"],
+                    "attempts": row["attempts"]
+                }
+                for row in rows if row["status"] == "failed"
+            ]
+        }
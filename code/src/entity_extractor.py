@@ -1,28 +1,30 @@
-import tenacity
-from langchain.text_splitter import CharacterTextSplitter
 import json
-from groq import Groq
+from groq import Groq, APIError
 from dotenv import load_dotenv
 import os
-from langchain.tools import tool, StructuredTool
-from langchain.agents import create_structured_chat_agent, AgentExecutor
-from langchain import hub
-from langchain_groq import ChatGroq
-from duckduckgo_search import DDGS
-from agenthub_tools.duckduckgo import search, news
 from langchain_community.document_loaders.csv_loader import CSVLoader
-import shutil
+
+from llm_gateway import gateway, prompt_key
+from tokens import estimate_tokens
+
+
+# llama-3.3-70b-versatile: 128k context window, output capped per call
+MODEL_CONTEXT_TOKENS = int(os.environ.get("EXTRACTION_CONTEXT_TOKENS", 131072))
+MAX_COMPLETION_TOKENS = 32768
+# Extracted JSON per input token; outputs repeat the record plus entity fields, so they run larger
+OUTPUT_TOKENS_PER_INPUT_TOKEN = float(os.environ.get("EXTRACTION_OUTPUT_RATIO", 2.0))
+# Fraction of MAX_COMPLETION_TOKENS the expected output may fill, leaving headroom for estimate error
+OUTPUT_HEADROOM = float(os.environ.get("EXTRACTION_OUTPUT_HEADROOM", 0.75))
+MAX_RECORDS_PER_CHUNK = int(os.environ.get("EXTRACTION_MAX_RECORDS_PER_CHUNK", 100))
+EXTRACTION_PROMPT = "prompt.txt"
+TEXT_RECORD_SEPARATOR = "---"
 
 
-last_chunk_index =0
 def text_input_reader(filePath):
     with open(filePath, 'r') as file:
         data = file.read()
-        text_splitter = CharacterTextSplitter(separator="---",chunk_size=1000,chunk_overlap=0)
-        chunks = text_splitter.split_text(data)
-    return chunks
+    return [record.strip() for record in data.split(TEXT_RECORD_SEPARATOR) if record.strip()]
 def csv_input_reader(filepath):
-    chunk_size=10
     loader = CSVLoader(filepath)
     data = loader.load()
     rowdata=[]
@@ -31,23 +33,91 @@ def csv_input_reader(filepath):
         record+=row.page_content
         record+="}"
         rowdata.append(record)
-    
-    if len(rowdata)> chunk_size:
-        chunks= [rowdata[i:i + chunk_size] for i in range(0, len(rowdata), chunk_size)]
-    else:
-        chunks = [rowdata]
+    return rowdata
 
+
+def input_token_budget(prompt_path=EXTRACTION_PROMPT):
+    """
+    Input tokens per extraction call: small enough that the expected output fits in the completion
+    limit, and that prompt + input + completion fit in the model context.
+    """
+    with open(prompt_path, 'r') as f:
+        prompt_tokens = estimate_tokens(f.read())
+    by_output = MAX_COMPLETION_TOKENS * OUTPUT_HEADROOM / OUTPUT_TOKENS_PER_INPUT_TOKEN
+    by_context = MODEL_CONTEXT_TOKENS - MAX_COMPLETION_TOKENS - prompt_tokens
+    return int(min(by_output, by_context))
+
+
+def pack_records(records, budget, max_records=MAX_RECORDS_PER_CHUNK):
+    """
+    Greedily packs whole records into chunks of at most `budget` estimated tokens. A record is never
+    split; one larger than the budget goes into a chunk of its own.
+    """
+    chunks, current, current_tokens = [], [], 0
+    for record in records:
+        tokens = estimate_tokens(record)
+        if current and (current_tokens + tokens > budget or len(current) >= max_records):
+            chunks.append(current)
+            current, current_tokens = [], 0
+        current.append(record)
+        current_tokens += tokens
+    if current:
+        chunks.append(current)
     return chunks
-def extract_entities(chunks):
-    entities = []
-    i=0
+
+
+def extract_chunk(records, render, retries=1):
+    """
+    Extracts one chunk and returns (entities, failed_records). Output that does not parse (usually
+    truncated JSON) is retried by splitting the chunk in half, down to single records; a single
+    record is retried `retries` more times before it is returned as failed. An API error the
+    gateway gave up on (timeout, rate limit) fails the chunk's records without losing other chunks.
+    """
+    chunk = render(records)
+    expected_output = int(estimate_tokens(chunk) * OUTPUT_TOKENS_PER_INPUT_TOKEN)
+    try:
+        output = entity_extractor_llm(chunk=chunk, filepath=EXTRACTION_PROMPT,
+                                      expected_output_tokens=min(expected_output, MAX_COMPLETION_TOKENS))
+    except APIError as e:
+        print(f"Extraction of {len(records)} records failed ({type(e).__name__}: {e})")
+        return [], records
+    try:
+        entities = json.loads(output)
+        return (entities if isinstance(entities, list) else [entities]), []
+    except json.JSONDecodeError as e:
+        if len(records) == 1:
+            if retries > 0:
+                print(f"Extraction failed for record ({e}), retrying it")
+                return extract_chunk(records, render, retries - 1)
+            print(f"Extraction failed for record, giving up ({e}): {records[0][:200]!r}")
+            return [], records
+        middle = len(records) // 2
+        print(f"Extraction of {len(records)} records did not parse ({e}), retrying as two halves")
+        left, left_failed = extract_chunk(records[:middle], render)
+        right, right_failed = extract_chunk(records[middle:], render)
+        return left + right, left_failed + right_failed
+
+
+def extract_entities(chunks, render=str):
+    entities, failed = [], []
     for chunk in chunks:
-        entities_str=entity_extractor_llm(chunk=chunk,filepath="prompt.txt")
-        entities.extend(json.loads(entities_str))
-    return entities
+        chunk_entities, chunk_failed = extract_chunk(chunk, render)
+        entities.extend(chunk_entities)
+        failed.extend(chunk_failed)
+    return entities, failed
+
+_client = None
+
 
-def entity_extractor_llm(chunk,filepath=None,temperature=0.6,top_p=1):
-    client = Groq(api_key=os.environ.get('GROQ_API_KEY'))
+def groq_client():
+    global _client
+    if _client is None:
+        # Retries are handled by the gateway so the shared limiter sees every attempt
+        _client = Groq(api_key=os.environ.get('GROQ_API_KEY'), max_retries=0)
+    return _client
+
+
+def entity_extractor_llm(chunk,filepath=None,temperature=0.6,top_p=1,expected_output_tokens=2048,response_format=None):
     json_prompt = []
     if filepath:
         with open(filepath,'r') as f:
@@ -60,33 +130,47 @@ def entity_extractor_llm(chunk,filepath=None,temperature=0.6,top_p=1):
             }
     json_prompt.append(user_input)
     # print(json_prompt)
-    completion = client.chat.completions.create(
+    request = dict(
         model="llama-3.3-70b-versatile",
-            
         messages=json_prompt,
         temperature= temperature,
-        max_completion_tokens=32768,
+        max_completion_tokens=MAX_COMPLETION_TOKENS,
         top_p= top_p,
-        stream=True,
-        stop=None,
     )
-    extracted_entities=""
-    for chunk in completion:
-        # print(chunk.choices[0].delta.content or "",end="")
-        extracted_entities+=chunk.choices[0].delta.content or ""
-    return extracted_entities
+    if response_format:
+        request["response_format"] = response_format
+
+    def call():
+        if response_format:
+            # Groq does not stream in JSON mode
+            completion = groq_client().chat.completions.create(**request, stop=None)
+            return completion.choices[0].message.content
+        completion = groq_client().chat.completions.create(**request, stream=True, stop=None)
+        extracted_entities=""
+        for chunk in completion:
+            # print(chunk.choices[0].delta.content or "",end="")
+            extracted_entities+=chunk.choices[0].delta.content or ""
+        return extracted_entities
+
+    prompt_tokens = estimate_tokens(json.dumps(json_prompt))
+    return gateway.run(call, estimated_tokens=prompt_tokens + expected_output_tokens,
+                       coalesce_key=prompt_key(**request))
 
-def start(txtfile):
+def start(file_path, records=None):
+    """
+    Extracts the transactions of a .txt or .csv upload, or only `records` of it (as returned in
+    failed_records by an earlier call). Returns (transactions, failed_records).
+    """
     load_dotenv()
-    # txtfile="test.txt"
-    # txtfile="test.txt"
-    file_path = f"./{txtfile.filename}"  # Save location
-    txtfile.file.seek(0)
-    with open(file_path, "wb") as buffer:
-        shutil.copyfileobj(txtfile.file, buffer)
-    if txtfile.filename.endswith(".txt"):
-        chunks = text_input_reader(file_path)
-    if txtfile.filename.endswith(".csv"):
-        chunks=csv_input_reader(file_path)
-    extracted_entities = extract_entities(chunks)
-    return extracted_entities
+    if file_path.endswith(".txt"):
+        records = text_input_reader(file_path) if records is None else records
+        render = f"\n{TEXT_RECORD_SEPARATOR}\n".join
+    if file_path.endswith(".csv"):
+        records = csv_input_reader(file_path) if records is None else records
+        render = str
+    chunks = pack_records(records, input_token_budget())
+    print(f"Packed {len(records)} records into {len(chunks)} extraction call(s)")
+    transactions, failed_records = extract_entities(chunks, render)
+    if failed_records:
+        print(f"{len(failed_records)} of {len(records)} records could not be extracted")
+    return transactions, failed_records
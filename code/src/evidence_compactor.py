@@ -0,0 +1,216 @@
+import json
+import os
+import re
+
+from tokens import estimate_tokens, truncate_to_tokens
+
+# Per-source token budgets for the evidence sent to the reasoning model
+EVIDENCE_BUDGETS = {
+    "agent": int(os.environ.get("EVIDENCE_BUDGET_AGENT", 1200)),
+    "network": int(os.environ.get("EVIDENCE_BUDGET_NETWORK", 600)),
+    "ofac": int(os.environ.get("EVIDENCE_BUDGET_OFAC", 600)),
+    "wiki": int(os.environ.get("EVIDENCE_BUDGET_WIKI", 400)),
+}
+# Longest single fact (a relationship, an OFAC info text, an agent description) in tokens
+MAX_FACT_TOKENS = int(os.environ.get("EVIDENCE_MAX_FACT_TOKENS", 120))
+
+
+class _FactSet:
+    """Tracks facts already emitted so the same statement is not sent twice."""
+
+    def __init__(self):
+        self.seen = set()
+
+    @staticmethod
+    def _key(fact):
+        return " ".join(str(fact).lower().split())
+
+    def __contains__(self, fact):
+        return self._key(fact) in self.seen
+
+    def add(self, fact):
+        self.seen.add(self._key(fact))
+
+
+def _depth(relationship):
+    match = re.search(r"Depth: (\d+)", relationship)
+    return int(match.group(1)) if match else 0
+
+
+def _truncate_fields(record):
+    """Caps every string field of a header at MAX_FACT_TOKENS."""
+    return {key: truncate_to_tokens(value, MAX_FACT_TOKENS) if isinstance(value, str) else value
+            for key, value in record.items()}
+
+
+def _fit_headers(headers, budget):
+    """
+    Keeps the per-entity headers that fit in the budget, in order. Returns (kept, tokens used),
+    so headers count against the source budget like any other evidence. Headers should already
+    hold the keys the caller fills in later, and the list brackets and separators are counted too.
+    """
+    kept, used = [], estimate_tokens([])
+    for header in headers:
+        header = _truncate_fields(header)
+        cost = estimate_tokens(header) + 1
+        if used + cost > budget:
+            break
+        kept.append(header)
+        used += cost
+    return kept, used
+
+
+def _take_round_robin(lists, budget, facts):
+    """
+    Takes items from several ranked lists in turn until the token budget is spent,
+    so one noisy entity cannot crowd out the others. Facts already emitted are skipped, and an
+    item only counts as emitted once it has been kept.
+    """
+    taken = [[] for _ in lists]
+    used = 0
+    for rank in range(max((len(items) for items in lists), default=0)):
+        for i, items in enumerate(lists):
+            if rank < len(items):
+                if items[rank] in facts:
+                    continue
+                # As a JSON list item, so quotes, escapes and the separator are counted
+                cost = estimate_tokens([items[rank]])
+                if used + cost > budget:
+                    return taken
+                taken[i].append(items[rank])
+                facts.add(items[rank])
+                used += cost
+    return taken
+
+
+def compact_network(network_results, budget, facts):
+    entities = []
+    relationships = []
+    for result in network_results or []:
+        ranked = sorted(dict.fromkeys(result.get("relationships_summary", [])), key=_depth)
+        relationships.append([truncate_to_tokens(r, MAX_FACT_TOKENS) for r in ranked])
+        entities.append({
+            "name": result.get("name"),
+            "matched_name": result.get("matched_name"),
+            "matched_type": result.get("matched_type"),
+            "risk_score": result.get("risk_score"),
+            "confidence_score": result.get("confidence_score"),
+            "relationships": [],
+            # Upper bound of the final count, so the header is not under-costed
+            "relationships_omitted": len(ranked),
+        })
+
+    entities, used = _fit_headers(entities, budget)
+    relationships = relationships[:len(entities)]
+    for entity, kept, ranked in zip(entities, _take_round_robin(relationships, budget - used, facts), relationships):
+        entity["relationships"] = kept
+        if len(ranked) > len(kept):
+            entity["relationships_omitted"] = len(ranked) - len(kept)
+        else:
+            del entity["relationships_omitted"]
+    return entities
+
+
+def compact_ofac(ofac_results, budget, facts):
+    entities = []
+    matches = []
+    for result in ofac_results or []:
+        # Matches are "; "-joined; the most relevant is listed first by find_best_match
+        reasons = [r for r in str(result.get("reason", "")).split("; ") if r]
+        compacted = []
+        for reason in reasons:
+            reason = re.sub(
+                r"\(Info: (.*?)\) \(Match Score",
+                lambda m: f"(Info: {truncate_to_tokens(m.group(1), MAX_FACT_TOKENS)}) (Match Score",
+                reason,
+                flags=re.S
+            )
+            compacted.append(reason)
+        matches.append(compacted)
+        entities.append({
+            "entity": result.get("entity"),
+            "risk_score": result.get("risk_score"),
+            "confidence_score": result.get("confidence_score"),
+            "matches": [],
+        })
+
+    entities, used = _fit_headers(entities, budget)
+    for entity, kept in zip(entities, _take_round_robin(matches[:len(entities)], budget - used, facts)):
+        entity["matches"] = kept
+    return entities
+
+
+def compact_wiki(wiki_results, budget, facts):
+    entities = []
+    factors = []
+    for result in wiki_results or []:
+        breakdown = result.get("risk_breakdown", {})
+        ranked = sorted(breakdown.values(), key=lambda c: c.get("score", 0) * c.get("weight", 0), reverse=True)
+        entity_factors = [f for component in ranked for f in component.get("factors", [])]
+        evidence = result.get("evidence", {})
+        entity_factors += [f"News: {title}" for title in evidence.get("top_news", [])]
+        factors.append([truncate_to_tokens(f, MAX_FACT_TOKENS) for f in dict.fromkeys(entity_factors)])
+        entities.append({
+            "entity": result.get("entity"),
+            "jurisdiction": result.get("jurisdiction"),
+            "risk_score": result.get("risk_score"),
+            "risk_level": result.get("risk_level"),
+            "confidence": result.get("confidence"),
+            "factors": [],
+        })
+
+    entities, used = _fit_headers(entities, budget)
+    for entity, kept in zip(entities, _take_round_robin(factors[:len(entities)], budget - used, facts)):
+        entity["factors"] = kept
+    return entities
+
+
+def compact_agent(transaction, budget, facts):
+    if not isinstance(transaction, dict):
+        return truncate_to_tokens(transaction, budget)
+
+    header, used = _fit_headers([{
+        "Transaction ID": transaction.get("Transaction ID"),
+        "Amount": transaction.get("Amount"),
+        "Notes": transaction.get("Notes"),
+    }], budget)
+    compacted = header[0] if header else {}
+    # The entity list may use up to half the budget, leaving the rest for the agent's findings
+    entities, entity_tokens = _fit_headers(transaction.get("Entity") or [], budget // 2 - used)
+    compacted["Entity"] = entities
+    used += entity_tokens + estimate_tokens({"Entity": [], "internet_info": []})
+    descriptions = []
+    inference = transaction.get("inference_add_info")
+    if inference:
+        output = inference.get("output") if isinstance(inference, dict) else inference
+        descriptions.append(truncate_to_tokens(output, MAX_FACT_TOKENS * 2))
+    for info in transaction.get("internet_info", []):
+        descriptions.append(truncate_to_tokens(info.get("description", ""), MAX_FACT_TOKENS * 2))
+    descriptions = [d for d in descriptions if d]
+
+    compacted["internet_info"] = _take_round_robin([descriptions], budget - used, facts)[0]
+    return compacted
+
+
+def compact_evidence(ai_agent_inf, ofac_input, graph_input, wikidata_input, budgets=None):
+    """
+    Ranks, de-duplicates and truncates each source to its token budget so the reasoning prompt
+    stays bounded regardless of graph fan-out or OFAC info length.
+    """
+    budgets = {**EVIDENCE_BUDGETS, **(budgets or {})}
+    facts = _FactSet()
+    compacted = {
+        "agent": compact_agent(ai_agent_inf, budgets["agent"], facts),
+        "ofac": compact_ofac(ofac_input, budgets["ofac"], facts),
+        "network": compact_network(graph_input, budgets["network"], facts),
+        "wiki": compact_wiki(wikidata_input, budgets["wiki"], facts),
+    }
+
+    before = sum(estimate_tokens(str(v)) for v in [ai_agent_inf, ofac_input, graph_input, wikidata_input])
+    after = sum(estimate_tokens(v) for v in compacted.values())
+    print(f"Evidence compacted: ~{before} -> ~{after} tokens (saved ~{max(0, before - after)})")
+    return compacted
+
+
+def to_prompt_json(value):
+    return json.dumps(value, default=str, separators=(",", ":"), ensure_ascii=False)
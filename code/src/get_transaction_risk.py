@@ -1,8 +1,14 @@
-import pandas as pd
-from network_risk import compute_risk_score_with_details, match_entity
-from ofac_risk import compute_normalized_risk_score
+from network_risk import compute_risk_score_with_details, match_entity, async_compute_risk_score_with_details, async_match_entity
+from network_risk import current_graph_load, async_current_graph_load, load_node_embeddings
+from ofac_risk import compute_normalized_risk_score, load_ofac_index
 from wiki_risk import EntityRiskScorer
+from collections import OrderedDict
+from graph_db import AsyncGraph
+import asyncio
 import json
+import os
+import threading
+import time
 
 
 node_label_map = {
@@ -59,54 +65,181 @@ def calculate_overall_confidence(entity_risks):
     
     return overall_confidence_scores
 
-def compute_transaction_risk(driver, model, extracted_entities):
+# Network risk only depends on the graph load, so repeat counterparties are served from memory
+NETWORK_CACHE_SIZE = int(os.environ.get("NETWORK_CACHE_SIZE", 10000))
+
+
+class _NetworkRiskCache:
+    """LRU of (risk_score, relationships_summary) by matched name and type, shared by the sync and async paths."""
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            if key not in self.entries:
+                return None
+            self.entries.move_to_end(key)
+            return self.entries[key]
+
+    def put(self, key, value):
+        with self._lock:
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self.entries.clear()
+
+
+network_cache = _NetworkRiskCache(NETWORK_CACHE_SIZE)
+
+# How often to check whether prepare_network.py has recorded a new graph load
+GRAPH_LOAD_CHECK_SECONDS = float(os.environ.get("GRAPH_LOAD_CHECK_SECONDS", 60))
+_graph_load = {"load_id": None, "checked_at": 0.0}
+
+
+def refresh_on_graph_load(driver):
+    """Drops cached network risk and the mapped node embeddings once a new graph load is recorded."""
+    now = time.time()
+    if now - _graph_load["checked_at"] < GRAPH_LOAD_CHECK_SECONDS:
+        return
+    _graph_load["checked_at"] = now
+    if isinstance(driver, AsyncGraph):
+        load_id = driver.run(async_current_graph_load(driver.driver))
+    else:
+        load_id = current_graph_load(driver)
+    if load_id != _graph_load["load_id"]:
+        if _graph_load["load_id"] is not None:
+            print(f"Graph load changed to {load_id}, clearing network caches")
+        network_cache.clear()
+        load_node_embeddings.cache_clear()
+        _graph_load["load_id"] = load_id
+
+
+def _cached_network_risk(driver, matched_name, matched_type):
+    key = (matched_name, matched_type)
+    cached = network_cache.get(key)
+    if cached is None:
+        risk_score, relationships_summary = compute_risk_score_with_details(driver, matched_name, matched_type)
+        cached = (risk_score, tuple(relationships_summary))
+        network_cache.put(key, cached)
+    return cached
+
+
+async def _async_cached_network_risk(async_driver, matched_name, matched_type):
+    key = (matched_name, matched_type)
+    cached = network_cache.get(key)
+    if cached is None:
+        risk_score, relationships_summary = await async_compute_risk_score_with_details(async_driver, matched_name, matched_type)
+        cached = (risk_score, tuple(relationships_summary))
+        network_cache.put(key, cached)
+    return cached
+
+
+def _matched_entity(entity, matches):
+    return {
+        "name": entity["name"],
+        "type": entity["type"],
+        "matched_name": matches[0][0] if len(matches) else None,
+        "matched_type": node_label_map.get(entity["type"].lower(), "Entity"),
+        "confidence_score": matches[0][1] if len(matches) else 1
+    }
+
+
+def _network_result(entity, risk_score, relationships_summary):
+    return {
+        "name": entity["name"],
+        "type": entity["type"],
+        "matched_name": entity["matched_name"],
+        "matched_type": entity["matched_type"],
+        "risk_score": risk_score,
+        "relationships_summary": list(relationships_summary),
+        "confidence_score": float(entity["confidence_score"])
+    }
+
+
+def compute_network_risk(driver, model, extracted_entities):
     print("Computing network risk...")
     matched_entities = []
     for _, entity in enumerate(extracted_entities):
         matches = match_entity(driver, model, node_label_map, entity_name=entity["name"], entity_type=entity["type"].lower())
-        matched_entities.append({
-            "name": entity["name"],
-            "type": entity["type"],
-            "matched_name": matches[0][0] if len(matches) else None,
-            "matched_type": node_label_map.get(entity["type"].lower(), "Entity"),
-            "confidence_score": matches[0][1] if len(matches) else 1
-    })
+        matched_entities.append(_matched_entity(entity, matches))
+
+    network_risk_results = []
+    for entity in matched_entities:
+        risk_score, relationships_summary = _cached_network_risk(driver, entity["matched_name"], entity["matched_type"])
+        network_risk_results.append(_network_result(entity, risk_score, relationships_summary))
+    return network_risk_results
+
 
+async def compute_network_risk_async(async_driver, model, extracted_entities):
+    """
+    Same as compute_network_risk on an AsyncDriver, with all entities of a transaction
+    looked up concurrently.
+    """
+    async def network_risk(entity):
+        matches = await async_match_entity(async_driver, model, node_label_map, entity_name=entity["name"], entity_type=entity["type"].lower())
+        matched = _matched_entity(entity, matches)
+        risk_score, relationships_summary = await _async_cached_network_risk(async_driver, matched["matched_name"], matched["matched_type"])
+        return _network_result(matched, risk_score, relationships_summary)
 
+    return list(await asyncio.gather(*(network_risk(entity) for entity in extracted_entities)))
+
+
+def compute_local_risk(driver, model, extracted_entities, ofac_index=None, network_risk_results=None):
+    """
+    Cheap tier: network risk (graph lookups, cached) and OFAC risk (local index).
+    With an AsyncGraph the entities of the transaction are looked up concurrently.
+    Network results computed elsewhere can be passed in.
+    """
+    if network_risk_results is None:
+        refresh_on_graph_load(driver)
+        if isinstance(driver, AsyncGraph):
+            network_risk_results = driver.run(compute_network_risk_async(driver.driver, model, extracted_entities))
+        else:
+            network_risk_results = compute_network_risk(driver, model, extracted_entities)
 
     entity_risks = {}
-    network_risk_results = []
-    for entity in matched_entities:
-        risk_score, relationships_summary = compute_risk_score_with_details(driver, entity["matched_name"], entity["matched_type"])
-        network_risk_results.append({
-            "name": entity["name"],
-            "type": entity["type"],
-            "matched_name": entity["matched_name"],
-            "matched_type": entity["matched_type"],
-            "risk_score": risk_score,
-            "relationships_summary": relationships_summary,
-            "confidence_score": float(entity["confidence_score"])
-        })
-        entity_risks[entity["name"]] = {
-            "type": entity["type"],
-            "network_entity": entity["matched_name"],
-            "network_risk": risk_score,
-            "network_relationships_summary": relationships_summary[:5],
-            "network_confidence": float(entity["confidence_score"])
+    for result in network_risk_results:
+        entity_risks[result["name"]] = {
+            "type": result["type"],
+            "network_entity": result["matched_name"],
+            "network_risk": result["risk_score"],
+            "network_relationships_summary": result["relationships_summary"][:5],
+            "network_confidence": result["confidence_score"]
         }
 
 
     print("Computing ofac risk...")
     ofac_risk_results = []
-    ofac_df = pd.read_pickle("./ofac_embeddings.pkl")
+    if ofac_index is None:
+        ofac_index = load_ofac_index()
     for _, entity in enumerate(extracted_entities):
-        risk_result = compute_normalized_risk_score(model, entity["name"], ofac_df)
+        risk_result = compute_normalized_risk_score(model, entity["name"], ofac_index)
         ofac_risk_results.append(risk_result)
         entity_risks[entity["name"]]["ofac_entity"] = risk_result["entity"]
         entity_risks[entity["name"]]["ofac_risk"] = risk_result["risk_score"]
         entity_risks[entity["name"]]["ofac_reason"] = risk_result["reason"]
         entity_risks[entity["name"]]["ofac_confidence"] = float(risk_result["confidence_score"])
 
+    return {
+        "entity_risks": entity_risks,
+        "network_results": network_risk_results,
+        "ofac_results": ofac_risk_results,
+        "wiki_results": []
+    }
+
+
+def add_wiki_risk(local_risks, extracted_entities):
+    """
+    Expensive tier: Wikipedia, Wikidata and news lookups for every entity.
+    """
+    entity_risks = local_risks["entity_risks"]
     NEWS_API_KEY = ""
     
     scorer = EntityRiskScorer(NEWS_API_KEY)
@@ -122,6 +255,12 @@ def compute_transaction_risk(driver, model, extracted_entities):
         entity_risks[entity]["wiki_risk_breakdown"] = result["risk_breakdown"]
         entity_risks[entity]["wiki_confidence"] = float(result["confidence"])
 
+    local_risks["wiki_results"] = wiki_results
+    return local_risks
+
+
+def summarize_transaction_risk(risks):
+    entity_risks = risks["entity_risks"]
     overall_risk_scores = calculate_overall_risk(entity_risks)
     overall_confidence_score = calculate_overall_confidence(entity_risks)
     transaction_risk = {
@@ -130,9 +269,9 @@ def compute_transaction_risk(driver, model, extracted_entities):
         "entity_types": [],
         "confidence_score": sum(list(overall_confidence_score.values())) / len(list(overall_confidence_score.values())),
         "supporting_evidence": ["Offshore Leaks Database", "OFAC Sanctions List", "Entity wikipedia page"],
-        "network_results": network_risk_results,
-        "ofac_results": ofac_risk_results,
-        "wiki_results": wiki_results
+        "network_results": risks["network_results"],
+        "ofac_results": risks["ofac_results"],
+        "wiki_results": risks["wiki_results"]
     }
     for entity, risk_data in entity_risks.items():
         transaction_risk["entities"].append(entity)
@@ -141,4 +280,10 @@ def compute_transaction_risk(driver, model, extracted_entities):
 
     print(json.dumps(transaction_risk, indent=4))
 
-    return transaction_risk
\ No newline at end of file
+    return transaction_risk
+
+
+def compute_transaction_risk(driver, model, extracted_entities, ofac_index=None):
+    risks = compute_local_risk(driver, model, extracted_entities, ofac_index)
+    add_wiki_risk(risks, extracted_entities)
+    return summarize_transaction_risk(risks)
@@ -0,0 +1,137 @@
+import asyncio
+import os
+import threading
+import time
+from contextlib import contextmanager, asynccontextmanager
+
+from neo4j import GraphDatabase, AsyncGraphDatabase, READ_ACCESS
+
+# A neo4j:// (or neo4j+s://) URI enables cluster routing: read transactions go to read replicas
+NEO4J_URI = os.environ.get("NEO4J_URI", "bolt://localhost:7689")
+NEO4J_USER = os.environ.get("NEO4J_USER", "neo4j")
+MAX_POOL_SIZE = int(os.environ.get("NEO4J_MAX_POOL_SIZE", 50))
+ACQUISITION_TIMEOUT = float(os.environ.get("NEO4J_ACQUISITION_TIMEOUT", 30))
+FETCH_SIZE = int(os.environ.get("NEO4J_FETCH_SIZE", 1000))
+# The pipeline uses the async driver (concurrent lookups per transaction) unless disabled
+USE_ASYNC_GRAPH = os.environ.get("NEO4J_ASYNC", "1") == "1"
+
+
+class PoolStats:
+    """
+    Counts sessions checked out by this process. The driver does not expose its pool publicly,
+    so utilisation is measured around every session we open.
+    """
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.in_use = 0
+        self.peak = 0
+        self.acquired = 0
+        self.total_hold_time = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        with self._lock:
+            self.in_use += 1
+            self.acquired += 1
+            self.peak = max(self.peak, self.in_use)
+        return time.time()
+
+    def release(self, started):
+        with self._lock:
+            self.in_use -= 1
+            self.total_hold_time += time.time() - started
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "max_pool_size": self.max_size,
+                "in_use": self.in_use,
+                "peak_in_use": self.peak,
+                "utilization": round(self.in_use / self.max_size, 3) if self.max_size else None,
+                "sessions_opened": self.acquired,
+                "avg_session_seconds": round(self.total_hold_time / self.acquired, 4) if self.acquired else 0,
+            }
+
+
+pool_stats = PoolStats(MAX_POOL_SIZE)
+
+
+def _driver_config():
+    return {
+        "max_connection_pool_size": MAX_POOL_SIZE,
+        "connection_acquisition_timeout": ACQUISITION_TIMEOUT,
+        "fetch_size": FETCH_SIZE,
+    }
+
+
+def build_driver(uri=NEO4J_URI, user=NEO4J_USER, password=None):
+    return GraphDatabase.driver(uri, auth=(user, password), **_driver_config())
+
+
+def build_async_driver(uri=NEO4J_URI, user=NEO4J_USER, password=None):
+    return AsyncGraphDatabase.driver(uri, auth=(user, password), **_driver_config())
+
+
+class AsyncGraph:
+    """
+    An AsyncDriver running on its own event loop thread, so the synchronous pipeline can submit
+    coroutines from any thread and every caller in the process shares one connection pool.
+    """
+
+    def __init__(self, uri=NEO4J_URI, user=NEO4J_USER, password=None):
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self.loop.run_forever, name="neo4j-async", daemon=True)
+        self._thread.start()
+
+        async def connect():
+            return build_async_driver(uri, user, password)
+
+        self.driver = self.run(connect())
+
+    def run(self, coroutine):
+        """Runs a coroutine on the driver's loop and blocks until it completes."""
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop).result()
+
+    def close(self):
+        self.run(self.driver.close())
+        self.loop.call_soon_threadsafe(self.loop.stop)
+
+
+@contextmanager
+def read_session(driver):
+    """Read-only session; on a cluster URI its transactions are routed to read replicas."""
+    started = pool_stats.acquire()
+    try:
+        with driver.session(default_access_mode=READ_ACCESS, fetch_size=FETCH_SIZE) as session:
+            yield session
+    finally:
+        pool_stats.release(started)
+
+
+@asynccontextmanager
+async def async_read_session(driver):
+    started = pool_stats.acquire()
+    try:
+        async with driver.session(default_access_mode=READ_ACCESS, fetch_size=FETCH_SIZE) as session:
+            yield session
+    finally:
+        pool_stats.release(started)
+
+
+def read_records(driver, query, **params):
+    """Runs a query in a managed read transaction and returns its records as a list."""
+    def work(tx):
+        return list(tx.run(query, **params))
+
+    with read_session(driver) as session:
+        return session.execute_read(work)
+
+
+async def async_read_records(driver, query, **params):
+    async def work(tx):
+        result = await tx.run(query, **params)
+        return [record async for record in result]
+
+    async with async_read_session(driver) as session:
+        return await session.execute_read(work)
@@ -0,0 +1,319 @@
+import json
+import os
+from abc import ABC, abstractmethod
+import sqlite3
+import time
+import uuid
+from contextlib import contextmanager
+
+QUEUE_BROKER = os.environ.get("QUEUE_BROKER", "sqlite")
+QUEUE_DB_PATH = os.environ.get("QUEUE_DB_PATH", "./queue.db")
+QUEUE_REDIS_URL = os.environ.get("QUEUE_REDIS_URL", "redis://localhost:6379/0")
+QUEUE_NAME = os.environ.get("QUEUE_NAME", "screening")
+# Workers report outcomes on this queue and the backend writes them to its stores
+RESULTS_QUEUE_NAME = os.environ.get("RESULTS_QUEUE_NAME", f"{QUEUE_NAME}-results")
+# A reserved job that is not acked within this many seconds is handed to another worker
+VISIBILITY_TIMEOUT = float(os.environ.get("QUEUE_VISIBILITY_TIMEOUT", 600))
+MAX_ATTEMPTS = int(os.environ.get("QUEUE_MAX_ATTEMPTS", 3))
+RETRY_DELAY = float(os.environ.get("QUEUE_RETRY_DELAY_SECONDS", 30))
+
+
+class Job:
+    def __init__(self, job_id, payload, attempts, receipt, checkpoint=None):
+        self.job_id = job_id
+        self.payload = payload
+        self.attempts = attempts
+        # Identifies this delivery, so a worker whose reservation expired cannot ack a redelivered job
+        self.receipt = receipt
+        # Progress saved by an earlier delivery, see Broker.checkpoint
+        self.checkpoint = checkpoint
+
+
+class Broker(ABC):
+    """
+    At-least-once work queue. Jobs are reserved by the payload's "priority" (lower first), then in
+    order. Reserved jobs stay invisible for the visibility timeout and are redelivered if not
+    acked; failed jobs are retried up to MAX_ATTEMPTS, then dead-lettered.
+    """
+
+    @abstractmethod
+    def enqueue(self, payloads):
+        pass
+
+    @abstractmethod
+    def reserve(self, max_jobs=1, visibility_timeout=VISIBILITY_TIMEOUT):
+        """Returns up to max_jobs visible jobs, possibly none."""
+
+    @abstractmethod
+    def extend(self, job, visibility_timeout=VISIBILITY_TIMEOUT):
+        """Keeps a reserved job invisible for another visibility_timeout; False if the reservation was lost."""
+
+    @abstractmethod
+    def checkpoint(self, job, data):
+        """Saves progress on a reserved job; it is handed back as Job.checkpoint on redelivery."""
+
+    @abstractmethod
+    def ack(self, job):
+        pass
+
+    @abstractmethod
+    def fail(self, job, error):
+        """Schedules a retry and returns False, or dead-letters the job and returns True."""
+
+    @abstractmethod
+    def stats(self):
+        pass
+
+    def is_last_attempt(self, job):
+        """True if failing this delivery dead-letters the job."""
+        return job.attempts >= MAX_ATTEMPTS
+
+
+QUEUE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    job_id TEXT PRIMARY KEY,
+    queue TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'ready',
+    priority INTEGER NOT NULL DEFAULT 0,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    visible_at REAL NOT NULL,
+    receipt TEXT,
+    checkpoint TEXT,
+    error TEXT,
+    enqueued_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_visible ON jobs (queue, status, visible_at);
+"""
+
+
+class SQLiteBroker(Broker):
+    """
+    Broker on a local SQLite file: enough for one host, with any number of worker processes.
+    Reserved jobs keep status 'ready' and a future visible_at, so expiry needs no sweeper.
+    """
+
+    def __init__(self, db_path=QUEUE_DB_PATH, queue=QUEUE_NAME):
+        self.db_path = db_path
+        self.queue = queue
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            conn.executescript(QUEUE_SCHEMA)
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(jobs)")}
+            if "checkpoint" not in columns:
+                conn.execute("ALTER TABLE jobs ADD COLUMN checkpoint TEXT")
+            if "priority" not in columns:
+                conn.execute("ALTER TABLE jobs ADD COLUMN priority INTEGER NOT NULL DEFAULT 0")
+            conn.execute("CREATE INDEX IF NOT EXISTS jobs_priority ON jobs (queue, status, priority, visible_at)")
+            conn.commit()
+        finally:
+            conn.close()
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        try:
+            # IMMEDIATE takes the write lock up front so two workers cannot reserve the same rows
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        finally:
+            conn.close()
+
+    def enqueue(self, payloads):
+        now = time.time()
+        job_ids = [uuid.uuid4().hex for _ in payloads]
+        with self._connect() as conn:
+            conn.executemany(
+                "INSERT INTO jobs (job_id, queue, payload, priority, visible_at, enqueued_at) VALUES (?, ?, ?, ?, ?, ?)",
+                [(job_id, self.queue, json.dumps(p), p.get("priority", 0), now, now)
+                 for job_id, p in zip(job_ids, payloads)]
+            )
+        return job_ids
+
+    def reserve(self, max_jobs=1, visibility_timeout=VISIBILITY_TIMEOUT):
+        now = time.time()
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT job_id, payload, attempts, checkpoint FROM jobs WHERE queue = ? AND status = 'ready' "
+                "AND visible_at <= ? ORDER BY priority, visible_at LIMIT ?",
+                (self.queue, now, max_jobs)
+            ).fetchall()
+            jobs = [
+                Job(row["job_id"], json.loads(row["payload"]), row["attempts"] + 1, uuid.uuid4().hex,
+                    json.loads(row["checkpoint"]) if row["checkpoint"] else None)
+                for row in rows
+            ]
+            conn.executemany(
+                "UPDATE jobs SET attempts = ?, receipt = ?, visible_at = ? WHERE job_id = ?",
+                [(job.attempts, job.receipt, now + visibility_timeout, job.job_id) for job in jobs]
+            )
+        return jobs
+
+    def extend(self, job, visibility_timeout=VISIBILITY_TIMEOUT):
+        with self._connect() as conn:
+            cursor = conn.execute(
+                "UPDATE jobs SET visible_at = ? WHERE job_id = ? AND receipt = ? AND status = 'ready'",
+                (time.time() + visibility_timeout, job.job_id, job.receipt)
+            )
+        return cursor.rowcount > 0
+
+    def checkpoint(self, job, data):
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE jobs SET checkpoint = ? WHERE job_id = ? AND receipt = ?",
+                (json.dumps(data), job.job_id, job.receipt)
+            )
+
+    def ack(self, job):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM jobs WHERE job_id = ? AND receipt = ?", (job.job_id, job.receipt))
+
+    def fail(self, job, error):
+        dead = self.is_last_attempt(job)
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE jobs SET status = ?, visible_at = ?, error = ?, receipt = NULL "
+                "WHERE job_id = ? AND receipt = ?",
+                ("dead" if dead else "ready", time.time() + RETRY_DELAY * job.attempts, error,
+                 job.job_id, job.receipt)
+            )
+        return dead
+
+    def stats(self):
+        now = time.time()
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT SUM(status = 'ready' AND visible_at <= ?) AS ready, "
+                "SUM(status = 'ready' AND visible_at > ?) AS reserved_or_delayed, "
+                "SUM(status = 'dead') AS dead FROM jobs WHERE queue = ?",
+                (now, now, self.queue)
+            ).fetchone()
+        return {"broker": "sqlite", **{k: row[k] or 0 for k in row.keys()}}
+
+
+# Moves expired reservations back to the ready set at their rank, then pops the up to ARGV[3]
+# best-ranked jobs and reserves them until ARGV[2], all atomically on the server
+_RESERVE_SCRIPT = """
+local expired = redis.call('ZRANGEBYSCORE', KEYS[2], '-inf', ARGV[1])
+for _, id in ipairs(expired) do
+    redis.call('ZREM', KEYS[2], id)
+    redis.call('ZADD', KEYS[1], redis.call('HGET', KEYS[3] .. id, 'rank'), id)
+end
+local jobs = {}
+local popped = redis.call('ZPOPMIN', KEYS[1], ARGV[3])
+for i = 1, #popped, 2 do
+    local id = popped[i]
+    local receipt = ARGV[4] .. ':' .. i
+    redis.call('ZADD', KEYS[2], ARGV[2], id)
+    local attempts = redis.call('HINCRBY', KEYS[3] .. id, 'attempts', 1)
+    redis.call('HSET', KEYS[3] .. id, 'receipt', receipt)
+    local job = redis.call('HMGET', KEYS[3] .. id, 'payload', 'checkpoint')
+    table.insert(jobs, {id, job[1], attempts, receipt, job[2] or ''})
+end
+return jobs
+"""
+
+
+class RedisBroker(Broker):
+    """
+    Networked broker for workers spread over several hosts. Needs the `redis` package, which is
+    only imported when this broker is selected (QUEUE_BROKER=redis).
+    """
+
+    def __init__(self, url=QUEUE_REDIS_URL, queue=QUEUE_NAME):
+        try:
+            import redis
+        except ImportError:
+            raise ImportError("QUEUE_BROKER=redis needs the redis package: pip install redis")
+        self.redis = redis.Redis.from_url(url, decode_responses=True)
+        # Sorted by rank (priority, then enqueue time); a list in earlier versions, hence the new name
+        self.ready_key = f"{queue}:ready_ranked"
+        self.sequence_key = f"{queue}:sequence"
+        self.reserved_key = f"{queue}:reserved"
+        self.delayed_key = f"{queue}:delayed"
+        self.dead_key = f"{queue}:dead"
+        self.job_prefix = f"{queue}:job:"
+        self._reserve = self.redis.register_script(_RESERVE_SCRIPT)
+
+    def enqueue(self, payloads):
+        job_ids = [uuid.uuid4().hex for _ in payloads]
+        first = self.redis.incrby(self.sequence_key, len(payloads)) - len(payloads)
+        pipe = self.redis.pipeline()
+        for i, (job_id, payload) in enumerate(zip(job_ids, payloads)):
+            # Sequence numbers stay well below the stride, so any priority outranks a lower one
+            rank = payload.get("priority", 0) * 10 ** 12 + first + i
+            pipe.hset(self.job_prefix + job_id, mapping={"payload": json.dumps(payload), "attempts": 0, "rank": rank})
+            pipe.zadd(self.ready_key, {job_id: rank})
+        pipe.execute()
+        return job_ids
+
+    def _promote_delayed(self, now):
+        for job_id in self.redis.zrangebyscore(self.delayed_key, "-inf", now):
+            if self.redis.zrem(self.delayed_key, job_id):
+                self.redis.zadd(self.ready_key, {job_id: float(self.redis.hget(self.job_prefix + job_id, "rank"))})
+
+    def reserve(self, max_jobs=1, visibility_timeout=VISIBILITY_TIMEOUT):
+        now = time.time()
+        self._promote_delayed(now)
+        rows = self._reserve(
+            keys=[self.ready_key, self.reserved_key, self.job_prefix],
+            args=[now, now + visibility_timeout, max_jobs, uuid.uuid4().hex]
+        )
+        return [Job(job_id, json.loads(payload), int(attempts), receipt, json.loads(checkpoint) if checkpoint else None)
+                for job_id, payload, attempts, receipt, checkpoint in rows]
+
+    def _owns(self, job):
+        return self.redis.hget(self.job_prefix + job.job_id, "receipt") == job.receipt
+
+    def extend(self, job, visibility_timeout=VISIBILITY_TIMEOUT):
+        if not self._owns(job) or self.redis.zscore(self.reserved_key, job.job_id) is None:
+            return False
+        # XX only updates a reservation that has not been requeued in the meantime
+        self.redis.zadd(self.reserved_key, {job.job_id: time.time() + visibility_timeout}, xx=True)
+        return True
+
+    def checkpoint(self, job, data):
+        if self._owns(job):
+            self.redis.hset(self.job_prefix + job.job_id, "checkpoint", json.dumps(data))
+
+    def ack(self, job):
+        if self._owns(job):
+            self.redis.zrem(self.reserved_key, job.job_id)
+            self.redis.delete(self.job_prefix + job.job_id)
+
+    def fail(self, job, error):
+        dead = self.is_last_attempt(job)
+        if not self._owns(job):
+            return dead
+        pipe = self.redis.pipeline()
+        pipe.zrem(self.reserved_key, job.job_id)
+        pipe.hset(self.job_prefix + job.job_id, mapping={"error": error, "receipt": ""})
+        if dead:
+            pipe.lpush(self.dead_key, job.job_id)
+        else:
+            pipe.zadd(self.delayed_key, {job.job_id: time.time() + RETRY_DELAY * job.attempts})
+        pipe.execute()
+        return dead
+
+    def stats(self):
+        return {
+            "broker": "redis",
+            "ready": self.redis.zcard(self.ready_key),
+            "reserved_or_delayed": self.redis.zcard(self.reserved_key) + self.redis.zcard(self.delayed_key),
+            "dead": self.redis.llen(self.dead_key),
+        }
+
+
+def get_broker(kind=QUEUE_BROKER, queue=QUEUE_NAME):
+    if kind == "sqlite":
+        return SQLiteBroker(queue=queue)
+    if kind == "redis":
+        return RedisBroker(queue=queue)
+    raise ValueError(f"Unknown QUEUE_BROKER {kind!r}, expected 'sqlite' or 'redis'")
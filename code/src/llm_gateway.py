@@ -0,0 +1,316 @@
+import contextvars
+import hashlib
+import heapq
+import itertools
+import json
+import os
+import random
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import Future
+from contextlib import contextmanager
+
+import groq
+
+# Account-wide Groq limits shared by every LLM call, across processes (see LLM_LIMITER)
+REQUESTS_PER_MINUTE = float(os.environ.get("GROQ_REQUESTS_PER_MINUTE", 30))
+TOKENS_PER_MINUTE = float(os.environ.get("GROQ_TOKENS_PER_MINUTE", 60000))
+MAX_RETRIES = int(os.environ.get("LLM_MAX_RETRIES", 4))
+BACKOFF_BASE = float(os.environ.get("LLM_BACKOFF_BASE_SECONDS", 1))
+BACKOFF_MAX = float(os.environ.get("LLM_BACKOFF_MAX_SECONDS", 60))
+# The limits are per account, so every process must draw from the same buckets: "sqlite" shares
+# them between processes on one host, "redis" between hosts, "local" keeps them per process
+LIMITER = os.environ.get("LLM_LIMITER", "sqlite")
+LIMITER_DB_PATH = os.environ.get("LLM_LIMITER_DB_PATH", "./llm_limiter.db")
+LIMITER_REDIS_URL = os.environ.get("LLM_LIMITER_REDIS_URL", os.environ.get("QUEUE_REDIS_URL", "redis://localhost:6379/0"))
+
+# Lower value is served first
+INTERACTIVE = 0
+BULK = 1
+# A caller waiting for the limits stays registered this long past its expected wait, so a crashed
+# process cannot hold back less urgent callers for longer
+WAITER_TTL_SECONDS = 5
+# How long a less urgent caller backs off while a more urgent one is waiting
+YIELD_SECONDS = 0.5
+
+_priority = contextvars.ContextVar("llm_priority", default=INTERACTIVE)
+
+
+@contextmanager
+def llm_priority(priority):
+    """Sets the priority class of every LLM call made in this context."""
+    token = _priority.set(priority)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+def _take(state, amounts, limits, now, priority=INTERACTIVE, waiter=None):
+    """
+    One token-bucket step over several buckets (requests, tokens) that refill per minute.
+    Takes `amounts` only if every bucket has enough and no caller of a more urgent priority, in
+    any process sharing the state, is waiting; otherwise `waiter` is registered as waiting.
+    Requests larger than a bucket wait for a full one. Returns (seconds to wait, new state).
+    """
+    waiting = {w: entry for w, entry in state.get("waiting", {}).items() if entry[1] > now and w != waiter}
+    wait = state.get("paused_until", 0.0) - now
+    levels = {}
+    for name, amount in amounts.items():
+        capacity = limits[name]
+        rate = capacity / 60
+        level, updated = state.get("buckets", {}).get(name, (capacity, now))
+        levels[name] = min(capacity, level + (now - updated) * rate)
+        wait = max(wait, (min(amount, capacity) - levels[name]) / rate)
+    yields = any(waiting_priority < priority for waiting_priority, _ in waiting.values())
+    if wait <= 0 and not yields:
+        levels = {name: level - min(amounts[name], limits[name]) for name, level in levels.items()}
+    else:
+        if waiter is not None:
+            waiting[waiter] = (priority, now + max(wait, 0) + WAITER_TTL_SECONDS)
+        wait = max(wait, YIELD_SECONDS if yields else 0)
+    new_state = {"paused_until": state.get("paused_until", 0.0),
+                 "buckets": {name: (level, now) for name, level in levels.items()},
+                 "waiting": waiting}
+    return max(0.0, wait), new_state
+
+
+def _pause(state, seconds, now):
+    return {**state, "paused_until": max(state.get("paused_until", 0.0), now + seconds)}
+
+
+class LocalLimiter:
+    """Limits for this process alone; only correct if it is the only process using the account."""
+
+    def __init__(self, limits):
+        self.limits = limits
+        self.state = {}
+
+    def try_take(self, amounts, priority=INTERACTIVE, waiter=None):
+        wait, self.state = _take(self.state, amounts, self.limits, time.time(), priority, waiter)
+        return wait
+
+    def pause(self, seconds):
+        self.state = _pause(self.state, seconds, time.time())
+
+
+class SQLiteLimiter:
+    """Buckets kept in a SQLite file, shared by every backend and worker process on the host."""
+
+    def __init__(self, limits, db_path=LIMITER_DB_PATH):
+        self.limits = limits
+        self.db_path = db_path
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            conn.execute("CREATE TABLE IF NOT EXISTS llm_limiter (name TEXT PRIMARY KEY, state TEXT NOT NULL)")
+            conn.commit()
+        finally:
+            conn.close()
+
+    def _update(self, step):
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute("SELECT state FROM llm_limiter WHERE name = 'groq'").fetchone()
+            result, state = step(json.loads(row[0]) if row else {})
+            conn.execute("INSERT OR REPLACE INTO llm_limiter (name, state) VALUES ('groq', ?)", (json.dumps(state),))
+            conn.execute("COMMIT")
+            return result
+        finally:
+            conn.close()
+
+    def try_take(self, amounts, priority=INTERACTIVE, waiter=None):
+        return self._update(lambda state: _take(state, amounts, self.limits, time.time(), priority, waiter))
+
+    def pause(self, seconds):
+        self._update(lambda state: (None, _pause(state, seconds, time.time())))
+
+
+class RedisLimiter:
+    """Buckets kept in Redis, shared by processes on every host. Imports redis only when selected."""
+
+    def __init__(self, limits, url=LIMITER_REDIS_URL, key="llm_limiter:groq"):
+        try:
+            import redis
+        except ImportError:
+            raise ImportError("LLM_LIMITER=redis needs the redis package: pip install redis")
+        self.limits = limits
+        self.redis = redis.Redis.from_url(url, decode_responses=True)
+        self.key = key
+        self._watch_error = redis.WatchError
+
+    def _update(self, step):
+        with self.redis.pipeline() as pipe:
+            while True:
+                try:
+                    pipe.watch(self.key)
+                    raw = pipe.get(self.key)
+                    result, state = step(json.loads(raw) if raw else {})
+                    pipe.multi()
+                    pipe.set(self.key, json.dumps(state))
+                    pipe.execute()
+                    return result
+                except self._watch_error:
+                    continue
+
+    def try_take(self, amounts, priority=INTERACTIVE, waiter=None):
+        return self._update(lambda state: _take(state, amounts, self.limits, time.time(), priority, waiter))
+
+    def pause(self, seconds):
+        self._update(lambda state: (None, _pause(state, seconds, time.time())))
+
+
+def build_limiter(kind=LIMITER, requests_per_minute=REQUESTS_PER_MINUTE, tokens_per_minute=TOKENS_PER_MINUTE):
+    limits = {"requests": requests_per_minute, "tokens": tokens_per_minute}
+    if kind == "local":
+        return LocalLimiter(limits)
+    if kind == "sqlite":
+        return SQLiteLimiter(limits)
+    if kind == "redis":
+        return RedisLimiter(limits)
+    raise ValueError(f"Unknown LLM_LIMITER {kind!r}, expected 'local', 'sqlite' or 'redis'")
+
+
+def _is_retryable(error):
+    return isinstance(error, (groq.RateLimitError, groq.InternalServerError, groq.APIConnectionError))
+
+
+def _retry_after(error):
+    response = getattr(error, "response", None)
+    try:
+        return float(response.headers.get("retry-after"))
+    except (AttributeError, TypeError, ValueError):
+        return None
+
+
+class LLMGateway:
+    """
+    Single entry point for LLM calls in the process: a shared request/token rate limiter with
+    priority ordering, coalescing of identical in-flight prompts, and retries with full jitter.
+    """
+
+    def __init__(self, limiter=None):
+        # Built on first use, so importing this module creates no limiter file
+        self._limiter = limiter
+        self._limiter_lock = threading.Lock()
+        self._cond = threading.Condition()
+        self._queue = []
+        self._sequence = itertools.count()
+        # Names this process's waiters in the shared limiter state
+        self._waiter_prefix = uuid.uuid4().hex
+        self._inflight = {}
+        self._inflight_lock = threading.Lock()
+        self._stats = {
+            "requests": 0, "coalesced": 0, "retries": 0, "rate_limited": 0, "failures": 0,
+            "total_wait_seconds": 0.0, "max_wait_seconds": 0.0,
+        }
+
+    @property
+    def limiter(self):
+        with self._limiter_lock:
+            if self._limiter is None:
+                self._limiter = build_limiter()
+            return self._limiter
+
+    def _acquire(self, priority, tokens):
+        with self._cond:
+            ticket = (priority, next(self._sequence))
+            heapq.heappush(self._queue, ticket)
+            # A more urgent ticket takes over the head; the current head re-checks
+            self._cond.notify_all()
+        enqueued = time.monotonic()
+        while True:
+            with self._cond:
+                while self._queue[0] != ticket:
+                    self._cond.wait()
+            # The shared limiter may block on I/O, so it is called without holding the lock
+            wait = self.limiter.try_take({"requests": 1, "tokens": tokens}, priority,
+                                         f"{self._waiter_prefix}:{ticket[1]}")
+            with self._cond:
+                if wait <= 0:
+                    self._queue.remove(ticket)
+                    heapq.heapify(self._queue)
+                    waited = time.monotonic() - enqueued
+                    self._stats["total_wait_seconds"] += waited
+                    self._stats["max_wait_seconds"] = max(self._stats["max_wait_seconds"], waited)
+                    self._cond.notify_all()
+                    return
+                self._cond.wait(wait)
+
+    def _backoff(self, attempt, error):
+        delay = _retry_after(error) or random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+        if isinstance(error, groq.RateLimitError):
+            # Everyone shares the quota, so pause every process rather than just this caller
+            self.limiter.pause(delay)
+            with self._cond:
+                self._stats["rate_limited"] += 1
+        time.sleep(delay)
+
+    def _call(self, fn, priority, tokens):
+        for attempt in range(MAX_RETRIES + 1):
+            self._acquire(priority, tokens)
+            with self._cond:
+                self._stats["requests"] += 1
+            try:
+                return fn()
+            except Exception as e:
+                if attempt == MAX_RETRIES or not _is_retryable(e):
+                    with self._cond:
+                        self._stats["failures"] += 1
+                    raise
+                print(f"LLM call failed ({type(e).__name__}), retry {attempt + 1}/{MAX_RETRIES}")
+                with self._cond:
+                    self._stats["retries"] += 1
+                self._backoff(attempt, e)
+
+    def run(self, fn, estimated_tokens=1, priority=None, coalesce_key=None):
+        """
+        Runs fn() once the shared limits allow it. Calls with the same coalesce_key that overlap
+        share one underlying request and its result.
+        """
+        priority = _priority.get() if priority is None else priority
+        if coalesce_key is None:
+            return self._call(fn, priority, estimated_tokens)
+
+        with self._inflight_lock:
+            future = self._inflight.get(coalesce_key)
+            owner = future is None
+            if owner:
+                future = self._inflight[coalesce_key] = Future()
+        if not owner:
+            with self._cond:
+                self._stats["coalesced"] += 1
+            return future.result()
+
+        try:
+            result = self._call(fn, priority, estimated_tokens)
+            future.set_result(result)
+            return result
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._inflight_lock:
+                del self._inflight[coalesce_key]
+
+    def stats(self):
+        with self._cond:
+            stats = dict(self._stats)
+            stats["queue_depth"] = len(self._queue)
+            stats["queue_by_priority"] = {
+                "interactive": sum(1 for p, _ in self._queue if p == INTERACTIVE),
+                "bulk": sum(1 for p, _ in self._queue if p == BULK),
+            }
+            stats["avg_wait_seconds"] = round(stats["total_wait_seconds"] / stats["requests"], 3) if stats["requests"] else 0
+        with self._inflight_lock:
+            stats["in_flight_coalescable"] = len(self._inflight)
+        return stats
+
+
+def prompt_key(**request):
+    return hashlib.sha256(json.dumps(request, sort_keys=True, default=str).encode()).hexdigest()
+
+
+gateway = LLMGateway()
@@ -1,14 +1,83 @@
+import json
+import os
+import re
+
 from entity_extractor import entity_extractor_llm
+from evidence_compactor import compact_evidence, to_prompt_json
+
+# Transactions packed into one reasoning call; 1 disables batching
+REASONER_BATCH_SIZE = int(os.environ.get("REASONER_BATCH_SIZE", 5))
+RESULT_KEYS = ["Transaction Id", "Extracted Entity", "Entity Type", "Risk Score",
+               "Supporting Evidence", "Confidence Score", "Reason"]
+
+
+def build_reasoner_input(ai_agent_inf,ofac_input=None,graph_input=None,wikidata_input=None):
+    evidence = compact_evidence(ai_agent_inf, ofac_input, graph_input, wikidata_input)
+    return f"""
+             ai agent inferences:{to_prompt_json(evidence["agent"])}
+             OFAC input : {to_prompt_json(evidence["ofac"])}
+             Graph database input : {to_prompt_json(evidence["network"])}
+             Wikidata input : {to_prompt_json(evidence["wiki"])}"""
+
+
+def _parse_json(output):
+    # Tolerate a markdown fence around the JSON even though the prompt forbids it
+    output = re.sub(r"^\s*```(?:json)?|```\s*$", "", output.strip())
+    return json.loads(output)
+
+
+def _is_valid_result(result):
+    if not isinstance(result, dict) or any(key not in result for key in RESULT_KEYS):
+        return False
+    return all(isinstance(result[key], (int, float)) for key in ["Risk Score", "Confidence Score"])
+
+
+def _batch_input(items):
+    keys = ", ".join(f'"{key}"' for key in items)
+    sections = "\n".join(f"=== Transaction key: {key} ===\n{llm_input}" for key, llm_input in items.items())
+    return f"""You will receive evidence for {len(items)} separate transactions.
+Analyse each transaction independently and return a single JSON object whose keys are exactly the
+transaction keys {keys}, and whose values each follow the output format agreed above.
+{sections}"""
 
 
-def llm_reasoner(ai_agent_inf,ofac_input=None,graph_input=None,wikidata_input=None):
-    llm_input = f"""
-             ai agent inferences:{ai_agent_inf}
-             OFAC input : {ofac_input}
-             Graph database input : {graph_input}
-             Wikidata input : {wikidata_input}"""
-    output = entity_extractor_llm(llm_input,"prompt_llm2.txt")
-    print(output)
-    return output
+def llm_reasoner_batch(items):
+    """
+    Reasons over several transactions in one call. `items` maps a transaction key to the output of
+    build_reasoner_input. Entries that are missing or fail validation are retried in a smaller batch,
+    then one by one. Returns (results, failures), both keyed by transaction key.
+    """
+    results = {}
+    failures = {}
+    pending = dict(items)
 
+    if len(pending) > 1:
+        for _ in range(2):
+            if len(pending) <= 1:
+                break
+            try:
+                parsed = _parse_json(entity_extractor_llm(_batch_input(pending), "prompt_llm2.txt",
+                                                           response_format={"type": "json_object"}))
+            except Exception as e:
+                print(f"Batched reasoning call failed for {len(pending)} transactions: {e}")
+                continue
+            if not isinstance(parsed, dict):
+                continue
+            for key in list(pending):
+                # JSON object keys are always strings
+                if _is_valid_result(parsed.get(str(key))):
+                    results[key] = parsed[str(key)]
+                    del pending[key]
+            print(f"Batched reasoning: {len(results)} parsed, {len(pending)} to retry")
 
+    for key, llm_input in pending.items():
+        try:
+            result = _parse_json(entity_extractor_llm(llm_input, "prompt_llm2.txt"))
+        except Exception as e:
+            failures[key] = f"{type(e).__name__}: {e}"
+            continue
+        if not _is_valid_result(result):
+            failures[key] = f"Invalid reasoning result: expected {', '.join(RESULT_KEYS)} with numeric scores"
+            continue
+        results[key] = result
+    return results, failures
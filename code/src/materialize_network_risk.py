@@ -0,0 +1,108 @@
+import os
+import time
+import uuid
+
+from graph_db import build_driver
+from network_risk import BASE_WEIGHTS, WEIGHTS_HASH, score_records, current_graph_load
+
+# Runs at the end of prepare_network.py; re-run on its own after changing BASE_WEIGHTS.
+# Nodes are paged in node_id order; an interrupted run resumes after the last node stamped
+# with its run id when the same MATERIALIZE_RUN_ID is passed.
+RUN_ID = os.environ.get("MATERIALIZE_RUN_ID", uuid.uuid4().hex)
+BATCH_SIZE = int(os.environ.get("MATERIALIZE_BATCH_SIZE", 500))
+EVIDENCE_TOP_K = int(os.environ.get("MATERIALIZE_EVIDENCE_TOP_K", 20))
+LABELS = ["Entity", "Officer", "Intermediary", "Address"]
+
+rel_types = "|".join(BASE_WEIGHTS)
+
+# Same traversal as network_risk._risk_query, anchored on each node of the batch. The batch is
+# a seek on the :Node(node_id) constraint index, so each one costs the same however far in it is.
+TRAVERSAL_QUERY = f"""
+MATCH (a:Node:%s)
+WHERE a.node_id > $after
+WITH a ORDER BY a.node_id LIMIT $batch_size
+CALL {{
+    WITH a
+    MATCH path = (a)-[r:{rel_types}*..10]-(b)
+    WITH b, labels(b) AS node_labels, [rel IN RELATIONSHIPS(path) | TYPE(rel)] AS relationship_types, length(path) AS depth
+    LIMIT 20
+    RETURN collect({{
+        connected_entity: CASE WHEN 'Address' IN node_labels THEN b.address ELSE b.name END,
+        source: b.sourceID,
+        relationship_types: relationship_types,
+        label: node_labels,
+        depth: depth
+    }}) AS records
+}}
+RETURN a.node_id AS node_id, records
+"""
+
+RESUME_QUERY = """
+MATCH (a:Node:%s)
+WHERE a.risk_run_id = $run_id
+RETURN max(a.node_id) AS after
+"""
+
+WRITE_QUERY = """
+UNWIND $rows AS row
+MATCH (a:Node {node_id: row.node_id})
+SET a.risk_score = row.risk_score,
+    a.risk_evidence = row.risk_evidence,
+    a.risk_weights_hash = $weights_hash,
+    a.risk_run_id = $run_id,
+    a.risk_load_id = $load_id,
+    a.risk_computed_at = datetime()
+"""
+
+
+def materialize_label(driver, label, load_id):
+    with driver.session() as session:
+        after = session.execute_read(lambda tx: tx.run(RESUME_QUERY % label, run_id=RUN_ID).single()["after"])
+    if after is None:
+        after = -1
+    else:
+        print(f"{label}: resuming after node {after}")
+    processed = 0
+    start = time.time()
+    while True:
+        with driver.session() as session:
+            batch = session.execute_read(
+                lambda tx: list(tx.run(TRAVERSAL_QUERY % label, after=after, batch_size=BATCH_SIZE))
+            )
+            if not batch:
+                break
+            rows = []
+            for record in batch:
+                risk_score, evidence = score_records(record["records"], top_k=EVIDENCE_TOP_K)
+                rows.append({"node_id": record["node_id"], "risk_score": risk_score, "risk_evidence": evidence})
+            session.execute_write(
+                lambda tx: tx.run(WRITE_QUERY, rows=rows, weights_hash=WEIGHTS_HASH, run_id=RUN_ID,
+                                  load_id=load_id).consume()
+            )
+        after = rows[-1]["node_id"]
+        processed += len(rows)
+        print(f"{label}: {processed} nodes materialised ({processed / (time.time() - start):.0f} nodes/s)")
+    return processed
+
+
+def materialize_network_risk(load_id=None):
+    """
+    Precomputes network risk score and top-k evidence paths as properties on every
+    Entity, Officer, Intermediary and Address node, stamped with the graph load they belong to
+    (by default the current one).
+    """
+    driver = build_driver(password=os.environ.get('NEO4J_RISK_DB_PASSWORD'))
+    try:
+        load_id = load_id or current_graph_load(driver)
+        if load_id is None:
+            print("No graph load recorded; run prepare_network.py first")
+            return
+        print(f"Materialising network risk (run {RUN_ID}, load {load_id}, weights {WEIGHTS_HASH})...")
+        for label in LABELS:
+            materialize_label(driver, label, load_id)
+    finally:
+        driver.close()
+
+
+if __name__ == "__main__":
+    materialize_network_risk()
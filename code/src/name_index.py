@@ -0,0 +1,91 @@
+import os
+import re
+import unicodedata
+
+import numpy as np
+
+from shared_artifacts import artifact_path, save_array, load_array
+
+NGRAM_SIZE = 3
+
+
+def normalize_name(name):
+    """Lower-cases, strips accents and punctuation so transliterations share n-grams."""
+    name = unicodedata.normalize("NFKD", str(name or ""))
+    name = "".join(c for c in name if not unicodedata.combining(c)).lower()
+    return " ".join(re.sub(r"[^a-z0-9]+", " ", name).split())
+
+
+def name_ngrams(name):
+    """
+    Returns the unique character n-grams of a name, each packed into an int64
+    (three 21-bit code points), so the index can be searched with plain numpy.
+    """
+    padded = f" {normalize_name(name)} "
+    grams = {padded[i:i + NGRAM_SIZE] for i in range(len(padded) - NGRAM_SIZE + 1)}
+    return np.array(sorted((ord(a) << 42) | (ord(b) << 21) | ord(c) for a, b, c in grams), dtype=np.int64)
+
+
+class NgramIndex:
+    """
+    Character n-gram inverted index over names in CSR layout:
+    gram_keys (sorted) -> postings[offsets[i]:offsets[i + 1]] row ids.
+    """
+
+    def __init__(self, gram_keys, offsets, postings, gram_counts):
+        self.gram_keys = gram_keys
+        self.offsets = offsets
+        self.postings = postings
+        self.gram_counts = gram_counts
+
+    def __len__(self):
+        return len(self.gram_counts)
+
+    @classmethod
+    def build(cls, names):
+        grams_per_name = [name_ngrams(name) for name in names]
+        gram_counts = np.array([len(g) for g in grams_per_name], dtype=np.int32)
+        all_grams = np.concatenate(grams_per_name) if len(names) else np.array([], dtype=np.int64)
+        all_rows = np.repeat(np.arange(len(names), dtype=np.int32), gram_counts)
+
+        order = np.lexsort((all_rows, all_grams))
+        all_grams, postings = all_grams[order], all_rows[order]
+        gram_keys, starts = np.unique(all_grams, return_index=True)
+        offsets = np.append(starts, len(all_grams)).astype(np.int64)
+        return cls(gram_keys, offsets, postings, gram_counts)
+
+    def overlap(self, name, max_postings=50000):
+        """
+        Returns (row_ids, dice) for every name sharing at least one n-gram with the query.
+        Grams with more than max_postings rows carry little signal and are skipped.
+        """
+        query = name_ngrams(name)
+        positions = np.searchsorted(self.gram_keys, query)
+        in_range = positions < len(self.gram_keys)
+        positions = positions[in_range]
+        positions = positions[self.gram_keys[positions] == query[in_range]]
+        lists = [
+            self.postings[self.offsets[p]:self.offsets[p + 1]]
+            for p in positions
+            if self.offsets[p + 1] - self.offsets[p] <= max_postings
+        ]
+        if not lists:
+            return np.array([], dtype=np.int64), np.array([], dtype=np.float32)
+
+        row_ids, shared = np.unique(np.concatenate(lists), return_counts=True)
+        dice = 2 * shared / (len(query) + self.gram_counts[row_ids])
+        return row_ids.astype(np.int64), dice.astype(np.float32)
+
+    def save(self, directory, prefix="ngram"):
+        save_array(directory, f"{prefix}.gram_keys", self.gram_keys)
+        save_array(directory, f"{prefix}.offsets", self.offsets)
+        save_array(directory, f"{prefix}.postings", self.postings)
+        save_array(directory, f"{prefix}.gram_counts", self.gram_counts)
+
+    @classmethod
+    def load(cls, name, prefix="ngram"):
+        """Maps a published index read-only, or returns None if the artifact has no index."""
+        if not os.path.exists(os.path.join(artifact_path(name), f"{prefix}.postings.npy")):
+            return None
+        return cls(*(load_array(name, f"{prefix}.{key}")
+                     for key in ["gram_keys", "offsets", "postings", "gram_counts"]))
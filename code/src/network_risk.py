@@ -1,51 +1,102 @@
-def match_entity(driver, model, node_label_map, entity_name, entity_type, threshold=0.75):
-    """
-    Match an entity based on its type using full-text search for speed.
+import asyncio
+import hashlib
+import json
+import os
+from functools import lru_cache
+
+import numpy as np
+
+from graph_db import read_records, async_read_records
+from shared_artifacts import KeyedEmbeddings
+
+INDEX_NAMES = {
+    "Entity": "entity_name_index",
+    "Officer": "officer_name_index",
+    "Address": "address_name_index",
+    "Intermediary": "intermediary_name_index"
+}
+
+
+def _match_query(node_label):
+    # Use full-text search to find top candidates
+    return f"""
+    CALL db.index.fulltext.queryNodes("{INDEX_NAMES[node_label]}", $name)
+    YIELD node, score
+    RETURN {'node.name' if node_label != 'Address' else 'node.address'} AS matched_name, node.node_id AS node_id, score ORDER BY score DESC LIMIT 5
     """
-    node_label = node_label_map.get(entity_type, "Entity")  # Default to 'Entity' if type is unknown
 
-    if node_label == "Officer":
-        threshold = 0.9
 
-    index_name = {
-        "Entity": "entity_name_index",
-        "Officer": "officer_name_index",
-        "Address": "address_name_index",
-        "Intermediary": "intermediary_name_index"
-    }[node_label]
+# Candidate-name embeddings written by prepare_node_embeddings.py, keyed by node_id
+NODE_EMBEDDINGS_DIR = os.environ.get("NODE_EMBEDDINGS_DIR", "./data/node_embeddings")
 
-    # Use full-text search to find top candidates
-    query = f"""
-    CALL db.index.fulltext.queryNodes("{index_name}", $name) 
-    YIELD node, score 
-    RETURN {'node.name' if node_label != 'Address' else 'node.address'} AS matched_name, score ORDER BY score DESC LIMIT 5
+
+@lru_cache(maxsize=1)
+def load_node_embeddings():
     """
+    Maps the node embedding sidecar straight from NODE_EMBEDDINGS_DIR, or returns None if it has
+    not been prepared. It is not copied to shared memory: at millions of nodes that would pin
+    gigabytes of RAM, while the page cache already shares the file's pages between processes.
+    """
+    if not os.path.exists(os.path.join(NODE_EMBEDDINGS_DIR, "embeddings.npy")):
+        return None
+    return KeyedEmbeddings(NODE_EMBEDDINGS_DIR)
 
 
-    with driver.session() as session:
-        results = session.run(query, name=entity_name)
-        
-        # ✅ Store the results in a list before processing
-        matches = [(record["matched_name"], record["score"]) for record in results]
+def _match_settings(node_label_map, entity_type, threshold):
+    node_label = node_label_map.get(entity_type, "Entity")  # Default to 'Entity' if type is unknown
 
+    if node_label == "Officer":
+        threshold = 0.9
+    return node_label, threshold
+
+
+def _rank_candidates(model, entity_name, matches, threshold):
     # If no matches, return empty list
     if not matches:
         return []
 
-    # Use Sentence Transformers only on the retrieved results
+    # Candidate vectors come from the precomputed sidecar; only names missing from it are encoded
     candidate_names = [match[0] for match in matches]
-    name_embeddings = model.encode(candidate_names)
-    entity_embedding = model.encode([entity_name])
-
-    similarities = [
-        (name, model.similarity(entity_embedding, emb)) 
-        for name, emb in zip(candidate_names, name_embeddings)
-    ]
-    
+    name_embeddings = np.zeros((len(matches), model.get_sentence_embedding_dimension()), dtype=np.float32)
+    found = np.zeros(len(matches), dtype=bool)
+    node_embeddings = load_node_embeddings()
+    if node_embeddings is not None:
+        # Nodes loaded without a node_id can never be in the sidecar
+        node_ids = [-1 if match[1] is None else match[1] for match in matches]
+        name_embeddings, found = node_embeddings.lookup(node_ids)
+    missing = np.flatnonzero(~found)
+    if len(missing):
+        name_embeddings[missing] = model.encode([candidate_names[i] for i in missing], normalize_embeddings=True)
+    entity_embedding = model.encode([entity_name], normalize_embeddings=True)[0]
+
+    # Both sides are normalised, so the dot product is the cosine similarity
+    similarities = list(zip(candidate_names, (name_embeddings @ entity_embedding).tolist()))
+
     # Return the best matches above a similarity threshold
     return [(match[0], match[1]) for match in sorted(similarities, key=lambda x: x[1], reverse=True) if match[1] > threshold]
 
 
+def match_entity(driver, model, node_label_map, entity_name, entity_type, threshold=0.75):
+    """
+    Match an entity based on its type using full-text search for speed.
+    """
+    node_label, threshold = _match_settings(node_label_map, entity_type, threshold)
+    records = read_records(driver, _match_query(node_label), name=entity_name)
+    matches = [(record["matched_name"], record["node_id"]) for record in records]
+    return _rank_candidates(model, entity_name, matches, threshold)
+
+
+async def async_match_entity(driver, model, node_label_map, entity_name, entity_type, threshold=0.75):
+    """
+    Async variant of match_entity for an AsyncDriver. The model runs in a worker thread
+    so the event loop keeps serving other graph queries.
+    """
+    node_label, threshold = _match_settings(node_label_map, entity_type, threshold)
+    records = await async_read_records(driver, _match_query(node_label), name=entity_name)
+    matches = [(record["matched_name"], record["node_id"]) for record in records]
+    return await asyncio.to_thread(_rank_candidates, model, entity_name, matches, threshold)
+
+
 BASE_WEIGHTS = {
     "officer_of": 2.0,           # High risk if shared officers exist
     "registered_address": 1.5,   # Medium risk if multiple entities share an address
@@ -53,45 +104,65 @@ BASE_WEIGHTS = {
     "similar": 1.0               # Lower risk but still relevant
 }
 
-def compute_risk_score_with_details(driver, entity_name, entity_type):
-    risk_score = 0
-    related_entities = []
-    relationships_summary = []
 
-    query = f"""
-    MATCH path = (a:{entity_type.capitalize()} {{name:$entity}})-[r:officer_of|intermediary_of|registered_address|similar*..10]-(b)
+# Property a matched name is stored in; the anchor lookup on it is a range-index seek
+ANCHOR_PROPERTIES = {"Address": "address"}
+
+
+def _anchor(entity_type):
+    label = entity_type.capitalize()
+    return f"a:{label} {{{ANCHOR_PROPERTIES.get(label, 'name')}:$entity}}"
+
+
+def _risk_query(entity_type):
+    return f"""
+    MATCH path = ({_anchor(entity_type)})-[r:officer_of|intermediary_of|registered_address|similar*..10]-(b)
     WITH a, b, b.sourceID as source, labels(b) AS node_labels, [rel IN RELATIONSHIPS(path) | TYPE(rel)] AS relationship_types, length(path) AS depth
-    RETURN 
-        a.name AS entity, 
-        CASE 
+    RETURN
+        a.name AS entity,
+        CASE
             WHEN 'Address' IN node_labels THEN b.address
-            ELSE b.name 
+            ELSE b.name
         END AS connected_entity,
         source,
-        relationship_types, 
+        relationship_types,
         labels(b) as label,
         depth
      LIMIT 20;
     """
 
-    with driver.session() as session:
-        records = session.run(query, entity=entity_name)
-
-        # print(records.data())
-        for record in records:
-            relationships = record["relationship_types"]
-            depth = record["depth"]
-            connected_entity = record["connected_entity"]
-            label = record["label"]
-            source = record["source"]
-
-            related_entities.append(connected_entity)
 
-            for rel in relationships:
-                weight = BASE_WEIGHTS.get(rel, 1)  # Default weight = 1
-                adjusted_weight = weight / (depth + 1)  # Reduce impact as depth increases
-                risk_score += adjusted_weight
-            relationships_summary.append(f"""Entity: {connected_entity} Source: {source} Depth: {depth}""")
+def score_records(records, top_k=None):
+    """
+    Scores traversal records. With top_k, the relationship summary is limited to the top_k
+    records by their contribution to the score, highest first.
+    """
+    risk_score = 0
+    related_entities = []
+    relationships_summary = []
+    contributions = []
+
+    for record in records:
+        relationships = record["relationship_types"]
+        depth = record["depth"]
+        connected_entity = record["connected_entity"]
+        label = record["label"]
+        source = record["source"]
+
+        related_entities.append(connected_entity)
+
+        contribution = 0
+        for rel in relationships:
+            weight = BASE_WEIGHTS.get(rel, 1)  # Default weight = 1
+            adjusted_weight = weight / (depth + 1)  # Reduce impact as depth increases
+            contribution += adjusted_weight
+        risk_score += contribution
+        contributions.append(contribution)
+        relationships_summary.append(f"""Entity: {connected_entity} Source: {source} Depth: {depth}""")
+
+    if top_k is not None:
+        ranked = sorted(zip(contributions, relationships_summary), key=lambda x: x[0], reverse=True)
+        relationships_summary = [summary for _, summary in ranked[:top_k]]
 
     # Normalize risk score
     max_risk_score = sum(BASE_WEIGHTS.values()) * 5 # Max depth = 5 (assuming > 5 means a layered network)
@@ -99,3 +170,64 @@ def compute_risk_score_with_details(driver, entity_name, entity_type):
 
     return round(normalized_risk_score, 3), relationships_summary
 
+
+# Materialised features are only trusted if they were computed with the current weights
+WEIGHTS_HASH = hashlib.sha1(json.dumps(BASE_WEIGHTS, sort_keys=True).encode()).hexdigest()[:12]
+USE_MATERIALIZED = os.environ.get("NETWORK_RISK_MATERIALIZED", "1") == "1"
+
+
+# Stamped by prepare_network.py once a load, its materialised features and node embeddings are ready
+GRAPH_LOAD_QUERY = "MATCH (g:GraphLoad {key: 'current'}) RETURN g.load_id AS load_id"
+
+
+def _materialized_query(entity_type):
+    # Features written for an earlier load are ignored, so a reload never serves stale scores
+    return f"""
+    MATCH (g:GraphLoad {{key: 'current'}})
+    MATCH ({_anchor(entity_type)})
+    WHERE a.risk_weights_hash = $weights_hash AND a.risk_load_id = g.load_id
+    RETURN a.risk_score AS risk_score, a.risk_evidence AS risk_evidence
+    LIMIT 1
+    """
+
+
+def current_graph_load(driver):
+    records = read_records(driver, GRAPH_LOAD_QUERY)
+    return records[0]["load_id"] if records else None
+
+
+async def async_current_graph_load(driver):
+    records = await async_read_records(driver, GRAPH_LOAD_QUERY)
+    return records[0]["load_id"] if records else None
+
+
+def _from_materialized(records):
+    if not records:
+        return None
+    return records[0]["risk_score"], list(records[0]["risk_evidence"] or [])
+
+
+def compute_risk_score_with_details(driver, entity_name, entity_type):
+    """
+    Reads the risk precomputed by materialize_network_risk.py when it is present and current,
+    otherwise walks the graph.
+    """
+    if USE_MATERIALIZED:
+        materialized = _from_materialized(read_records(
+            driver, _materialized_query(entity_type), entity=entity_name, weights_hash=WEIGHTS_HASH
+        ))
+        if materialized is not None:
+            return materialized
+    records = read_records(driver, _risk_query(entity_type), entity=entity_name)
+    return score_records(records)
+
+
+async def async_compute_risk_score_with_details(driver, entity_name, entity_type):
+    if USE_MATERIALIZED:
+        materialized = _from_materialized(await async_read_records(
+            driver, _materialized_query(entity_type), entity=entity_name, weights_hash=WEIGHTS_HASH
+        ))
+        if materialized is not None:
+            return materialized
+    records = await async_read_records(driver, _risk_query(entity_type), entity=entity_name)
+    return score_records(records)
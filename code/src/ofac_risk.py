@@ -1,32 +1,169 @@
 import pandas as pd
-from fuzzywuzzy import fuzz, process
-from sklearn.metrics.pairwise import cosine_similarity
 import numpy as np
 from textblob import TextBlob
 import re
+import os
+from shared_artifacts import publish_artifact, save_array, save_strings, load_array, MappedTable, DISK_DIR
+from ann_index import IVFInt8Index
+from name_index import NgramIndex
 
-def find_best_match(model, entity_name, ofac_df, top_n=3, threshold=0.75):
+OFAC_ARTIFACT = "ofac"
+OFAC_VECTORS_ARTIFACT = "ofac_vectors"
+OFAC_ARTIFACT_VERSION = 3
+OFAC_COLUMNS = ["ID", "Name", "Type", "Sanction_Program", "Additional_Info", "Other_Info", "Source_List"]
+
+# Lists smaller than this are scanned exactly; larger ones go through the IVF index
+ANN_MIN_SIZE = int(os.environ.get("OFAC_ANN_MIN_SIZE", 50000))
+ANN_NPROBE = int(os.environ.get("OFAC_ANN_NPROBE", 16))
+ANN_RERANK = int(os.environ.get("OFAC_ANN_RERANK", 100))
+
+# Candidate generation: names retrieved from the n-gram index plus the closest embeddings
+LEXICAL_CANDIDATES = int(os.environ.get("OFAC_LEXICAL_CANDIDATES", 50))
+SEMANTIC_CANDIDATES = int(os.environ.get("OFAC_SEMANTIC_CANDIDATES", 20))
+LEXICAL_WEIGHT = float(os.environ.get("OFAC_LEXICAL_WEIGHT", 0.5))
+
+
+class OfacIndex:
     """
-    Finds the top N closest OFAC matches for a given entity using sentence transformer embeddings.
+    Read-only view over the OFAC list: an L2-normalised embedding matrix plus the metadata columns
+    used for scoring. Built either from the shared memory-mapped artifact or from a DataFrame.
     """
-    entity_embedding = model.encode(entity_name, convert_to_numpy=True)
-    
-    # Compute cosine similarity
-    similarities = cosine_similarity([entity_embedding], np.stack(ofac_df["embedding"].values))[0]
+
+    def __init__(self, embeddings, table, ann=None, ngrams=None):
+        self.embeddings = embeddings
+        self.table = table
+        self.ann = ann
+        self.ngrams = ngrams
+
+    def __len__(self):
+        return len(self.embeddings)
+
+    def row(self, idx):
+        return self.table.row(idx)
+
+    @classmethod
+    def from_dataframe(cls, ofac_df):
+        embeddings = _normalize(np.stack(ofac_df["embedding"].values).astype(np.float32))
+        metadata = _metadata_frame(ofac_df)
+        return cls(embeddings, _FrameTable(metadata), ngrams=NgramIndex.build(metadata["Name"].tolist()))
+
+
+class _FrameTable:
+    def __init__(self, df):
+        self.df = df
+
+    def row(self, idx):
+        return self.df.iloc[idx].to_dict()
+
+
+def _metadata_frame(ofac_df):
+    # Pickles prepared before consolidated lists were supported only contain the SDN list
+    if "Source_List" not in ofac_df.columns:
+        ofac_df = ofac_df.assign(Source_List="SDN")
+    return ofac_df[OFAC_COLUMNS].fillna("")
+
+
+def _normalize(embeddings):
+    norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+    norms[norms == 0] = 1  # Empty names were stored as zero vectors
+    return embeddings / norms
 
 
+def publish_ofac_artifacts(pickle_path="./ofac_embeddings.pkl"):
+    """
+    Publishes the OFAC embeddings and metadata from the prepared pickle as memory-mapped files.
+    Only the first worker on a host does the work; the rest map the result.
+    The exact float vectors are published under DISK_DIR; shared memory only holds the metadata,
+    the n-gram index and, for large lists, the IVF centroids and int8 codes.
+    """
+    loaded = {}
+
+    def embeddings_and_metadata():
+        if not loaded:
+            ofac_df = pd.read_pickle(pickle_path)
+            loaded["embeddings"] = _normalize(np.stack(ofac_df["embedding"].values).astype(np.float32))
+            loaded["metadata"] = _metadata_frame(ofac_df)
+        return loaded["embeddings"], loaded["metadata"]
+
+    def build_vectors(tmp_dir):
+        save_array(tmp_dir, "embeddings", embeddings_and_metadata()[0])
+
+    def build(tmp_dir):
+        embeddings, metadata = embeddings_and_metadata()
+        for column in OFAC_COLUMNS:
+            save_strings(tmp_dir, column, metadata[column].tolist())
+        NgramIndex.build(metadata["Name"].tolist()).save(tmp_dir)
+        if len(embeddings) >= ANN_MIN_SIZE:
+            IVFInt8Index.build(embeddings).save(tmp_dir)
+
+    publish_artifact(OFAC_VECTORS_ARTIFACT, build_vectors, source_path=pickle_path,
+                     version=OFAC_ARTIFACT_VERSION, base_dir=DISK_DIR)
+    return publish_artifact(OFAC_ARTIFACT, build, source_path=pickle_path, version=OFAC_ARTIFACT_VERSION)
+
+
+def load_ofac_index(pickle_path="./ofac_embeddings.pkl"):
+    publish_ofac_artifacts(pickle_path)
+    return OfacIndex(
+        load_array(OFAC_VECTORS_ARTIFACT, "embeddings", base_dir=DISK_DIR),
+        MappedTable(OFAC_ARTIFACT, OFAC_COLUMNS),
+        IVFInt8Index.load(OFAC_ARTIFACT),
+        NgramIndex.load(OFAC_ARTIFACT)
+    )
 
-    # Get top matches
-    top_indices = np.argsort(similarities)[::-1][:top_n]
 
+def find_best_match(model, entity_name, ofac_index, top_n=3, threshold=0.75):
+    """
+    Finds the top N closest OFAC matches for a given entity. Candidates come from a character
+    n-gram index and the sentence transformer embeddings; the union is scored on both.
+    """
+    if isinstance(ofac_index, pd.DataFrame):
+        ofac_index = OfacIndex.from_dataframe(ofac_index)
+
+    entity_embedding = model.encode(entity_name, convert_to_numpy=True).astype(np.float32)
+    entity_embedding /= np.linalg.norm(entity_embedding) or 1
+
+    # Stage 1: candidates from the n-gram index and from the embedding space
+    if ofac_index.ngrams is not None:
+        lexical_ids, lexical_scores = ofac_index.ngrams.overlap(entity_name)
+    else:
+        lexical_ids, lexical_scores = np.array([], dtype=np.int64), np.array([], dtype=np.float32)
+    if len(lexical_ids) > LEXICAL_CANDIDATES:
+        keep = np.argpartition(-lexical_scores, LEXICAL_CANDIDATES - 1)[:LEXICAL_CANDIDATES]
+        lexical_top = lexical_ids[keep]
+    else:
+        lexical_top = lexical_ids
+
+    if ofac_index.ann is not None:
+        semantic_ids, _ = ofac_index.ann.search(
+            entity_embedding, ofac_index.embeddings, k=SEMANTIC_CANDIDATES, nprobe=ANN_NPROBE, rerank=ANN_RERANK
+        )
+    else:
+        # Embeddings are pre-normalised, so cosine similarity is a single mat-vec product
+        similarities = ofac_index.embeddings @ entity_embedding
+        k = min(SEMANTIC_CANDIDATES, len(similarities))
+        semantic_ids = np.argpartition(-similarities, k - 1)[:k]
+
+    # Stage 2: score the union with embedding and string similarity over whole arrays
+    candidates = np.union1d(lexical_top, semantic_ids).astype(np.int64)
+    semantic = np.asarray(ofac_index.embeddings[candidates], dtype=np.float32) @ entity_embedding
+    lexical = np.zeros(len(candidates), dtype=np.float32)
+    if len(lexical_ids):
+        order = np.argsort(lexical_ids)
+        positions = np.minimum(np.searchsorted(lexical_ids, candidates, sorter=order), len(lexical_ids) - 1)
+        found = lexical_ids[order[positions]] == candidates
+        lexical[found] = lexical_scores[order[positions[found]]]
+    blended = LEXICAL_WEIGHT * lexical + (1 - LEXICAL_WEIGHT) * semantic
+    scores = np.maximum(semantic, blended)
+
+    top_n = min(top_n, len(candidates))
+    best = np.argsort(-scores)[:top_n]
+    top_indices, top_scores = candidates[best], scores[best]
 
     matches = []
-    for idx in top_indices:
-        match_name = ofac_df.iloc[idx]["Name"]
-        match_score = similarities[idx]
-        match_data = ofac_df.iloc[[idx]]  # Keep as DataFrame
-        if(similarities[idx] > threshold):
-            matches.append((match_name, float(match_score), match_data))
+    for idx, match_score in zip(top_indices, top_scores):
+        if match_score > threshold:
+            match_data = ofac_index.row(idx)
+            matches.append((match_data["Name"], float(match_score), match_data))
     
     return matches
 
@@ -112,7 +249,7 @@ def compute_sanction_risk(sanction_str):
     return round(max_risk, 3)  # Normalize between 0-1
 
 
-def compute_normalized_risk_score(model, entity_name, ofac_df):
+def compute_normalized_risk_score(model, entity_name, ofac_index):
     """
     Computes a normalized risk score (0 to 1) based on:
     - Sentence Transformer Name Match
@@ -120,10 +257,10 @@ def compute_normalized_risk_score(model, entity_name, ofac_df):
     - Sentiment risk
     - Keyword-based risk
     """
-    matches = find_best_match(model, entity_name, ofac_df)
+    matches = find_best_match(model, entity_name, ofac_index)
 
     if not matches:
-        return {"entity": entity_name, "risk_score": 0, "reason": "No OFAC match found", "confidence_score": 1}
+        return {"entity": entity_name, "risk_score": 0, "reason": "No OFAC match found", "confidence_score": 1, "match_score": 0}
 
     # Define max values for normalization
     MAX_MATCH_SCORE = 1  # Cosine similarity is already between [0,1]
@@ -135,8 +272,6 @@ def compute_normalized_risk_score(model, entity_name, ofac_df):
     reasons = []
 
     for match_name, match_score, match_data in matches:
-        match_data = match_data.iloc[0]  
-
         sanction_risk = compute_sanction_risk(match_data["Sanction_Program"])
 
         info_text = match_data["Additional_Info"] + match_data["Other_Info"]
@@ -162,5 +297,6 @@ def compute_normalized_risk_score(model, entity_name, ofac_df):
         "entity": entity_name,
         "risk_score": round(float(max_normalized_risk), 3),
         "confidence_score": float(sum([m[1] for m in matches]) / len(matches)),
+        "match_score": float(max(m[1] for m in matches)),
         "reason": "; ".join(reasons)
     }
\ No newline at end of file
@@ -0,0 +1,101 @@
+from get_transaction_risk import compute_local_risk, add_wiki_risk
+from llm_reasoner import build_reasoner_input, llm_reasoner_batch, REASONER_BATCH_SIZE
+from risk_cascade import triage, early_exit_result, local_risk_scores
+from search_agent import chat_agent
+
+
+def extracted_entities_of(transaction):
+    extracted_entities = []
+    for entity in transaction["Entity"]:
+        extracted_entities.append({
+            "name": entity["Name"],
+            "type": entity["Type"],
+            "place": entity["Place"] if entity["Place"] else None,
+        })
+    return extracted_entities
+
+
+def gather_evidence(driver, model, ofac_index, transaction):
+    """
+    Runs the cascade up to the reasoning step. Returns (result, None, annotations) when the cheap
+    tier decides, otherwise (None, reasoner_input, annotations). Annotations (tiers run and
+    per-entity local scores) are added to the final result.
+    The cheap tier (network + OFAC) always runs; wiki/news and the search agent only run when
+    the cheap tier cannot decide.
+    """
+    extracted_entities = extracted_entities_of(transaction)
+    tiers_run = ["local"]
+    transaction_risks = compute_local_risk(driver, model, extracted_entities, ofac_index)
+
+    annotations = {
+        "Tiers Run": tiers_run,
+        "Entity Risk Scores": local_risk_scores(transaction_risks["entity_risks"])
+    }
+
+    decision, reason = triage(transaction_risks)
+    print(f"Cascade triage: {decision or 'uncertain'} ({reason})")
+    if decision is not None:
+        return early_exit_result(transaction, transaction_risks, decision, reason), None, annotations
+
+    tiers_run.append("enrichment")
+    add_wiki_risk(transaction_risks, extracted_entities)
+    print("Starting agentic web search...")
+    search_agent_response = chat_agent(transaction)
+
+    reasoner_input = build_reasoner_input(
+        search_agent_response,
+        ofac_input=transaction_risks["ofac_results"],
+        graph_input=transaction_risks["network_results"],
+        wikidata_input=transaction_risks["wiki_results"]
+    )
+    tiers_run.append("reasoning")
+    return None, reasoner_input, annotations
+
+
+def screen_transactions(driver, model, ofac_index, transactions, on_result, on_failure,
+                        batch_size=REASONER_BATCH_SIZE, on_evidence=None, saved_evidence=None):
+    """
+    Screens (key, transaction) pairs. Transactions that need the reasoning model are packed into
+    calls of up to batch_size. on_result(key, result) and on_failure(key, error) are called as soon
+    as each transaction completes, so callers can checkpoint.
+    on_evidence(key, reasoner_input, annotations) is called before a transaction waits for a batched
+    reasoning call; passing those back in saved_evidence (key -> (reasoner_input, annotations))
+    skips the evidence tiers for them on a later run.
+    """
+    waiting = {}
+    saved_evidence = saved_evidence or {}
+
+    def flush():
+        results, failures = llm_reasoner_batch({key: item[0] for key, item in waiting.items()})
+        for key, (_, annotations) in waiting.items():
+            if key in results:
+                results[key].update(annotations)
+                on_result(key, results[key])
+            else:
+                on_failure(key, failures.get(key, "No reasoning result returned"))
+        waiting.clear()
+
+    for key, transaction in transactions:
+        if key in saved_evidence:
+            waiting[key] = saved_evidence[key]
+            if len(waiting) >= batch_size:
+                flush()
+            continue
+        try:
+            result, reasoner_input, annotations = gather_evidence(driver, model, ofac_index, transaction)
+            if result is None and on_evidence:
+                on_evidence(key, reasoner_input, annotations)
+        except Exception as e:
+            print(f"Transaction {transaction.get('Transaction ID')} failed: {e}")
+            on_failure(key, f"{type(e).__name__}: {e}")
+            continue
+        if result is not None:
+            result.update(annotations)
+            on_result(key, result)
+            continue
+        waiting[key] = (reasoner_input, annotations)
+        if len(waiting) >= batch_size:
+            flush()
+    if waiting:
+        flush()
+
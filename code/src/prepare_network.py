@@ -1,18 +1,165 @@
-from neo4j import GraphDatabase
+import csv
 import os
+import re
+import time
+import uuid
+from collections import defaultdict
 
-db_uri = "bolt://localhost:7687"
-db_user = "neo4j"
-db_password = os.environ.get('NEO4J_RISK_DB_PASSWORD')
-driver = GraphDatabase.driver(db_uri, auth=(db_user, db_password))
+from graph_db import build_driver
+from materialize_network_risk import materialize_network_risk
+from prepare_node_embeddings import prepare_node_embeddings
+
+driver = build_driver(password=os.environ.get('NEO4J_RISK_DB_PASSWORD'))
+
+# ICIJ Offshore Leaks CSV export
+DATA_DIR = os.environ.get("OFFSHORE_LEAKS_DIR", "./data/offshore_leaks")
+NODE_FILES = {
+    "Entity": "nodes-entities.csv",
+    "Officer": "nodes-officers.csv",
+    "Intermediary": "nodes-intermediaries.csv",
+    "Address": "nodes-addresses.csv",
+    "Other": "nodes-others.csv",
+}
+RELATIONSHIP_FILE = "relationships.csv"
+LOAD_BATCH_SIZE = int(os.environ.get("LOAD_BATCH_SIZE", 10000))
+INDEX_WAIT_SECONDS = int(os.environ.get("INDEX_WAIT_SECONDS", 600))
+
+
+def create_constraints():
+    """Every node also gets the :Node label so relationships can be joined on node_id with one index."""
+    with driver.session() as session:
+        session.run("CREATE CONSTRAINT node_id_unique IF NOT EXISTS FOR (n:Node) REQUIRE n.node_id IS UNIQUE")
 
 
 def create_full_text_index():
     """Creates a full-text index on Entity, Officer, and Address names."""
     with driver.session() as session:
-        session.run("CREATE FULLTEXT INDEX entity_name_index FOR (e:Entity) ON EACH [e.name]")
-        session.run("CREATE FULLTEXT INDEX officer_name_index FOR (o:Officer) ON EACH [o.name]")
-        session.run("CREATE FULLTEXT INDEX intermediary_name_index FOR (i:Intermediary) ON EACH [i.name]")
-        session.run("CREATE FULLTEXT INDEX address_name_index FOR (a:Address) ON EACH [a.address]")
+        session.run("CREATE FULLTEXT INDEX entity_name_index IF NOT EXISTS FOR (e:Entity) ON EACH [e.name]")
+        session.run("CREATE FULLTEXT INDEX officer_name_index IF NOT EXISTS FOR (o:Officer) ON EACH [o.name]")
+        session.run("CREATE FULLTEXT INDEX intermediary_name_index IF NOT EXISTS FOR (i:Intermediary) ON EACH [i.name]")
+        session.run("CREATE FULLTEXT INDEX address_name_index IF NOT EXISTS FOR (a:Address) ON EACH [a.address]")
+
+
+def create_range_indexes():
+    """Range indexes for exact-match lookups, e.g. the traversal anchor in compute_risk_score_with_details."""
+    with driver.session() as session:
+        for label in ["Entity", "Officer", "Intermediary", "Address"]:
+            for prop in ["name", "address"]:
+                session.run(f"CREATE INDEX {label.lower()}_{prop}_range IF NOT EXISTS FOR (n:{label}) ON (n.{prop})")
+
+
+def wait_for_indexes():
+    start = time.time()
+    with driver.session() as session:
+        session.run("CALL db.awaitIndexes($timeout)", timeout=INDEX_WAIT_SECONDS).consume()
+    print(f"Indexes online after {time.time() - start:.1f}s")
+
+
+def _batches(path):
+    with open(path, newline="", encoding="utf-8") as f:
+        batch = []
+        for row in csv.DictReader(f):
+            batch.append(row)
+            if len(batch) >= LOAD_BATCH_SIZE:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+
+def _clean(row):
+    # Empty CSV cells become missing properties rather than empty strings
+    row = {key: value for key, value in row.items() if key and value not in ("", None)}
+    row["node_id"] = int(row["node_id"])
+    return row
+
+
+def load_nodes(label, filename):
+    path = os.path.join(DATA_DIR, filename)
+    if not os.path.exists(path):
+        print(f"Skipping {label}: {path} not found")
+        return
+    query = f"""
+    UNWIND $rows AS row
+    MERGE (n:Node {{node_id: row.node_id}})
+    SET n:{label}, n += row
+    """
+    loaded = 0
+    start = time.time()
+    for batch in _batches(path):
+        rows = [_clean(row) for row in batch]
+        with driver.session() as session:
+            session.execute_write(lambda tx: tx.run(query, rows=rows).consume())
+        loaded += len(rows)
+    elapsed = time.time() - start
+    print(f"Loaded {loaded} {label} nodes in {elapsed:.1f}s ({loaded / max(elapsed, 1e-9):.0f} rows/s)")
+
+
+def load_relationships():
+    path = os.path.join(DATA_DIR, RELATIONSHIP_FILE)
+    if not os.path.exists(path):
+        print(f"Skipping relationships: {path} not found")
+        return
+    loaded = 0
+    start = time.time()
+    for batch in _batches(path):
+        # Relationship types cannot be parameters, so each batch is split by type
+        by_type = defaultdict(list)
+        for row in batch:
+            rel_type = row.pop("rel_type", "")
+            if not re.fullmatch(r"[A-Za-z_]+", rel_type or ""):
+                continue
+            row = {key: value for key, value in row.items() if key and value not in ("", None)}
+            row["node_id_start"] = int(row["node_id_start"])
+            row["node_id_end"] = int(row["node_id_end"])
+            by_type[rel_type].append(row)
+
+        with driver.session() as session:
+            for rel_type, rows in by_type.items():
+                query = f"""
+                UNWIND $rows AS row
+                MATCH (a:Node {{node_id: row.node_id_start}})
+                MATCH (b:Node {{node_id: row.node_id_end}})
+                MERGE (a)-[r:{rel_type}]->(b)
+                SET r += row
+                """
+                session.execute_write(lambda tx: tx.run(query, rows=rows).consume())
+                loaded += len(rows)
+    elapsed = time.time() - start
+    print(f"Loaded {loaded} relationships in {elapsed:.1f}s ({loaded / max(elapsed, 1e-9):.0f} rows/s)")
+
+
+def record_graph_load(load_id):
+    """Points readers at a new load; materialised features of earlier loads stop being used."""
+    with driver.session() as session:
+        session.run(
+            "MERGE (g:GraphLoad {key: 'current'}) SET g.load_id = $load_id, g.loaded_at = datetime()",
+            load_id=load_id
+        ).consume()
+
+
+def prepare_network():
+    """
+    Idempotent graph preparation: constraints first so MERGE is an index seek, then bulk load,
+    then the full-text and range indexes used at query time, then the derived data
+    (materialised risk features and node-name embeddings). The load id is only recorded once the
+    derived data is ready; until then readers fall back to live traversal.
+    """
+    load_id = uuid.uuid4().hex
+    create_constraints()
+    wait_for_indexes()
+    for label, filename in NODE_FILES.items():
+        load_nodes(label, filename)
+    load_relationships()
+    create_full_text_index()
+    create_range_indexes()
+    wait_for_indexes()
+    materialize_network_risk(load_id)
+    prepare_node_embeddings()
+    record_graph_load(load_id)
+    print(f"Graph load {load_id} complete")
+
 
-create_full_text_index()
\ No newline at end of file
+if __name__ == "__main__":
+    prepare_network()
+    driver.close()
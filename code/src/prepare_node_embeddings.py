@@ -0,0 +1,83 @@
+import os
+import time
+
+import numpy as np
+from numpy.lib.format import open_memmap
+from sentence_transformers import SentenceTransformer
+
+from graph_db import build_driver
+from network_risk import NODE_EMBEDDINGS_DIR
+
+ENCODE_BATCH_SIZE = int(os.environ.get("ENCODE_BATCH_SIZE", 4096))
+
+# Same name property the full-text indexes cover; nodes come back sorted by node_id
+# so the sidecar can be written in one pass without sorting in memory.
+COUNT_QUERY = """
+MATCH (n:Node) WHERE n:Entity OR n:Officer OR n:Intermediary OR n:Address
+RETURN count(n) AS total
+"""
+NODES_QUERY = """
+MATCH (n:Node) WHERE n:Entity OR n:Officer OR n:Intermediary OR n:Address
+RETURN n.node_id AS node_id, CASE WHEN n:Address THEN n.address ELSE n.name END AS name
+ORDER BY n.node_id
+"""
+
+
+def prepare_node_embeddings():
+    """
+    Encodes every Entity, Officer, Intermediary and Address name once and stores the vectors
+    in a memory-mappable sidecar keyed by node_id. Re-run after each graph load.
+    """
+    model = SentenceTransformer("all-MiniLM-L6-v2")
+    driver = build_driver(password=os.environ.get('NEO4J_RISK_DB_PASSWORD'))
+    os.makedirs(NODE_EMBEDDINGS_DIR, exist_ok=True)
+    start = time.time()
+    try:
+        with driver.session() as session:
+            total = session.run(COUNT_QUERY).single()["total"]
+            keys = open_memmap(os.path.join(NODE_EMBEDDINGS_DIR, "keys.npy.tmp"), mode="w+",
+                               dtype=np.int64, shape=(total,))
+            embeddings = open_memmap(os.path.join(NODE_EMBEDDINGS_DIR, "embeddings.npy.tmp"), mode="w+",
+                                     dtype=np.float32, shape=(total, model.get_sentence_embedding_dimension()))
+
+            written = 0
+            batch_ids, batch_names = [], []
+
+            def flush():
+                nonlocal written
+                vectors = model.encode(batch_names, batch_size=256, convert_to_numpy=True, normalize_embeddings=True)
+                keys[written:written + len(batch_ids)] = batch_ids
+                embeddings[written:written + len(batch_ids)] = vectors
+                written += len(batch_ids)
+                batch_ids.clear()
+                batch_names.clear()
+                print(f"Encoded {written}/{total} node names ({written / (time.time() - start):.0f}/s)")
+
+            for record in session.run(NODES_QUERY):
+                if record["node_id"] is None:
+                    continue
+                batch_ids.append(record["node_id"])
+                batch_names.append(str(record["name"] or ""))
+                if len(batch_ids) >= ENCODE_BATCH_SIZE:
+                    flush()
+            if batch_ids:
+                flush()
+    finally:
+        driver.close()
+
+    keys.flush()
+    embeddings.flush()
+    del keys, embeddings
+    if written != total:
+        # Nodes without a node_id are skipped; trim the unused tail
+        for key in ["keys", "embeddings"]:
+            path = os.path.join(NODE_EMBEDDINGS_DIR, f"{key}.npy.tmp")
+            np.save(path + ".trim.npy", np.load(path, mmap_mode="r")[:written])
+            os.replace(path + ".trim.npy", path)
+    for key in ["keys", "embeddings"]:
+        os.replace(os.path.join(NODE_EMBEDDINGS_DIR, f"{key}.npy.tmp"), os.path.join(NODE_EMBEDDINGS_DIR, f"{key}.npy"))
+    print(f"Stored {written} node embeddings in {NODE_EMBEDDINGS_DIR} in {time.time() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    prepare_node_embeddings()
@@ -1,6 +1,9 @@
+import os
+import numpy as np
 import pandas as pd
-from fuzzywuzzy import fuzz, process
 from sentence_transformers import SentenceTransformer
+from ann_index import measure_recall
+from ofac_risk import publish_ofac_artifacts, load_ofac_index, ANN_NPROBE, ANN_RERANK
 
 
 model = SentenceTransformer("all-MiniLM-L6-v2")
@@ -11,9 +14,75 @@ columns = [
     "Call_Sign", "Vess_Type", "Tonnage", "GRT", "Vess_Flag", "Vess_Owner", "Other_Info"
 ]
 
-# Load the CSV (assuming it has no column names)
-ofac_df = pd.read_csv("./data/sdn.csv", names=columns, index_col=False)
+# Sanctions lists to consolidate. Every file uses the OFAC SDN column layout (e.g. the OFAC
+# consolidated non-SDN export, or national/UN lists converted to it). Missing files are skipped.
+SANCTIONS_LISTS = {
+    "SDN": "./data/sdn.csv",
+    "CONS": "./data/cons_prim.csv",
+}
+for extra in filter(None, os.environ.get("EXTRA_SANCTIONS_LISTS", "").split(",")):
+    list_name, list_path = extra.split("=", 1)
+    SANCTIONS_LISTS[list_name] = list_path
 
-ofac_df["embedding"] = ofac_df["Name"].apply(lambda x: model.encode(str(x).strip()) if isinstance(x, str) and x.strip() else [0.0] * 384)
 
-ofac_df.to_pickle("ofac_embeddings.pkl")
\ No newline at end of file
+def perturb(name, rng):
+    """Misspells a name by dropping, doubling or swapping one character."""
+    if len(name) < 4:
+        return name + name[-1:]
+    i = int(rng.integers(1, len(name) - 1))
+    edit = rng.integers(3)
+    if edit == 0:
+        return name[:i] + name[i + 1:]
+    if edit == 1:
+        return name[:i] + name[i] + name[i:]
+    return name[:i - 1] + name[i] + name[i - 1] + name[i + 1:]
+
+
+def recall_queries(names, size=200, seed=0):
+    """
+    Queries that are not vectors of the index: real aliases from the SDN alt.csv when available,
+    otherwise misspelt list names. Sampling indexed vectors would overstate recall.
+    """
+    rng = np.random.default_rng(seed)
+    alt_path = "./data/alt.csv"
+    if os.path.exists(alt_path):
+        alt_df = pd.read_csv(alt_path, names=["ent_num", "alt_num", "alt_type", "alt_name", "alt_remarks"],
+                             index_col=False)
+        aliases = [str(x).strip() for x in alt_df["alt_name"].dropna() if str(x).strip() not in ("", "-0-")]
+        queries, source = aliases, "SDN aliases"
+    else:
+        queries, source = [perturb(name, rng) for name in names if name], "misspelt names"
+    queries = [queries[i] for i in rng.choice(len(queries), size=min(size, len(queries)), replace=False)]
+    vectors = model.encode(queries, batch_size=256, convert_to_numpy=True).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True), source
+
+
+frames = []
+for list_name, list_path in SANCTIONS_LISTS.items():
+    if not os.path.exists(list_path):
+        print(f"Skipping {list_name}: {list_path} not found")
+        continue
+    # Load the CSV (assuming it has no column names)
+    list_df = pd.read_csv(list_path, names=columns, index_col=False)
+    list_df["Source_List"] = list_name
+    frames.append(list_df)
+    print(f"Loaded {len(list_df)} names from {list_name}")
+
+ofac_df = pd.concat(frames, ignore_index=True)
+
+names = [str(x).strip() if isinstance(x, str) else "" for x in ofac_df["Name"]]
+non_empty = [i for i, name in enumerate(names) if name]
+embeddings = np.zeros((len(names), model.get_sentence_embedding_dimension()), dtype=np.float32)
+embeddings[non_empty] = model.encode([names[i] for i in non_empty], batch_size=256, convert_to_numpy=True)
+ofac_df["embedding"] = list(embeddings)
+
+ofac_df.to_pickle("ofac_embeddings.pkl")
+
+# Build the shared artifacts (and the ANN index for large lists) as part of preparation
+publish_ofac_artifacts("ofac_embeddings.pkl")
+ofac_index = load_ofac_index("ofac_embeddings.pkl")
+
+if ofac_index.ann is not None:
+    queries, source = recall_queries(names)
+    recall = measure_recall(ofac_index.ann, ofac_index.embeddings, queries, k=10, nprobe=ANN_NPROBE, rerank=ANN_RERANK)
+    print(f"ANN recall@10 against brute force on {len(queries)} {source}: {recall:.3f}")
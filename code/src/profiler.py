@@ -0,0 +1,147 @@
+import json
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from contextlib import contextmanager
+
+PROFILE_DIR = os.environ.get("PROFILE_DIR", "./profiles")
+# Fraction of requests profiled without being asked; 0 disables sampling
+PROFILE_SAMPLE_RATE = float(os.environ.get("PROFILE_SAMPLE_RATE", 0))
+PROFILE_INTERVAL = float(os.environ.get("PROFILE_INTERVAL_MS", 5)) / 1000
+PROFILE_TOP_N = int(os.environ.get("PROFILE_TOP_N", 30))
+
+
+def should_profile(request):
+    """Profiling is opt-in per request (X-Profile header or ?profile=1) or sampled."""
+    if request.headers.get("x-profile", "").lower() in ("1", "true"):
+        return True
+    if request.query_params.get("profile", "").lower() in ("1", "true"):
+        return True
+    return PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE
+
+
+class SamplingProfiler:
+    """
+    Samples the stacks of every thread in the process from a background thread at a fixed
+    interval, so the profiled code runs unmodified. Work for one request is spread over threads
+    (the threadpool, the neo4j-async loop, asyncio.to_thread workers), so all are sampled and
+    kept apart by thread name; concurrent requests show up under their own threads.
+    """
+
+    def __init__(self, interval=PROFILE_INTERVAL):
+        self.interval = interval
+        # (thread name, stack) -> samples
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append((code.co_name, code.co_filename, code.co_firstlineno))
+                    frame = frame.f_back
+                if stack:
+                    self.stacks[(names.get(thread_id, str(thread_id)), tuple(reversed(stack)))] += 1
+
+    def start(self):
+        self.started = time.time()
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        self.duration = time.time() - self.started
+
+    def speedscope(self, name):
+        """Sampled profile in the speedscope file format (https://www.speedscope.app), one per thread."""
+        frame_index = {}
+        threads = {}
+        for (thread, stack), count in self.stacks.items():
+            samples, weights = threads.setdefault(thread, ([], []))
+            samples.append([frame_index.setdefault(frame, len(frame_index)) for frame in stack])
+            weights.append(count * self.interval)
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "name": name,
+            "shared": {"frames": [
+                {"name": function, "file": file, "line": line} for function, file, line in frame_index
+            ]},
+            "profiles": [{
+                "type": "sampled",
+                "name": f"{name} [{thread}]",
+                "unit": "seconds",
+                "startValue": 0,
+                "endValue": sum(weights),
+                "samples": samples,
+                "weights": weights,
+            } for thread, (samples, weights) in sorted(threads.items(), key=lambda t: -sum(t[1][1]))],
+        }
+
+    def summary(self, top_n=PROFILE_TOP_N):
+        total = sum(self.stacks.values())
+        self_counts, inclusive_counts, thread_counts = Counter(), Counter(), Counter()
+        for (thread, stack), count in self.stacks.items():
+            thread_counts[thread] += count
+            self_counts[thread, stack[-1]] += count
+            for frame in set(stack):
+                inclusive_counts[thread, frame] += count
+
+        def top(counts):
+            return [
+                {"thread": thread, "function": name, "file": file, "line": line, "samples": count,
+                 "percent": round(100 * count / total, 2)}
+                for (thread, (name, file, line)), count in counts.most_common(top_n)
+            ]
+
+        return {
+            "duration_seconds": round(self.duration, 3),
+            "samples": total,
+            "interval_ms": self.interval * 1000,
+            "threads": dict(thread_counts.most_common()),
+            "top_self": top(self_counts),
+            "top_inclusive": top(inclusive_counts),
+        }
+
+
+@contextmanager
+def profile_request(enabled, name="request"):
+    """
+    Profiles every thread while the block runs and saves a speedscope file plus a top-N summary
+    under PROFILE_DIR. Yields the profile id, or None when disabled (no overhead).
+    """
+    if not enabled:
+        yield None
+        return
+
+    profile_id = uuid.uuid4().hex
+    profiler = SamplingProfiler()
+    profiler.start()
+    try:
+        yield profile_id
+    finally:
+        profiler.stop()
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        with open(profile_path(profile_id, "speedscope"), "w") as f:
+            json.dump(profiler.speedscope(f"{name} {profile_id}"), f)
+        summary = profiler.summary()
+        with open(profile_path(profile_id, "summary"), "w") as f:
+            json.dump(summary, f, indent=2)
+        print(f"Saved profile {profile_id} ({summary['samples']} samples)")
+
+
+def profile_path(profile_id, kind):
+    # Ids are generated by us; refuse anything else so the path cannot escape PROFILE_DIR
+    if not profile_id or not all(c in "0123456789abcdef" for c in profile_id):
+        raise ValueError("Invalid profile id")
+    return os.path.join(PROFILE_DIR, f"{profile_id}.{kind}.json")
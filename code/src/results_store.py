@@ -0,0 +1,212 @@
+import json
+import os
+import sqlite3
+import unicodedata
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+RESULTS_DB_PATH = os.environ.get("RESULTS_DB_PATH", "./results.db")
+MAX_PAGE_SIZE = 500
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS screened_transactions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    batch_id TEXT,
+    position INTEGER,
+    transaction_id TEXT,
+    risk_score REAL,
+    confidence_score REAL,
+    tiers_run TEXT,
+    screened_at TEXT NOT NULL,
+    result TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS screened_transactions_txn ON screened_transactions (transaction_id);
+CREATE INDEX IF NOT EXISTS screened_transactions_risk ON screened_transactions (risk_score);
+CREATE INDEX IF NOT EXISTS screened_transactions_date ON screened_transactions (screened_at);
+
+CREATE TABLE IF NOT EXISTS screened_entities (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    screening_id INTEGER NOT NULL REFERENCES screened_transactions (id),
+    name TEXT NOT NULL,
+    name_key TEXT NOT NULL,
+    entity_type TEXT,
+    risk_score REAL,
+    screened_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS screened_entities_name ON screened_entities (name_key, screened_at);
+CREATE INDEX IF NOT EXISTS screened_entities_risk ON screened_entities (risk_score);
+CREATE INDEX IF NOT EXISTS screened_entities_date ON screened_entities (screened_at);
+"""
+
+
+def entity_key(name):
+    """
+    Lookup key for entity names in any script: NFKC, case-folded, with everything but letters,
+    marks and digits collapsed to single spaces. Unlike the OFAC n-gram key, non-Latin names keep
+    their characters, so two different Chinese or Arabic names do not share an empty key.
+    """
+    name = unicodedata.normalize("NFKC", str(name or "")).casefold()
+    return " ".join("".join(c if unicodedata.category(c)[0] in "LMN" else " " for c in name).split())
+
+
+def _as_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class ResultsStore:
+    """
+    Embedded store of completed screenings, indexed by entity name, risk score and date,
+    so past results can be browsed without re-running the pipeline.
+    """
+
+    def __init__(self, db_path=RESULTS_DB_PATH):
+        self.db_path = db_path
+        with self._connect() as conn:
+            conn.executescript(SCHEMA)
+            columns = {row["name"] for row in conn.execute("PRAGMA table_info(screened_transactions)")}
+            if "position" not in columns:
+                conn.execute("ALTER TABLE screened_transactions ADD COLUMN position INTEGER")
+            # One row per batch transaction; rows recorded before positions were kept have NULL
+            conn.execute(
+                "CREATE UNIQUE INDEX IF NOT EXISTS screened_transactions_position "
+                "ON screened_transactions (batch_id, position)"
+            )
+            # Version 1: name keys built by entity_key; older rows used an ASCII-only key
+            if conn.execute("PRAGMA user_version").fetchone()[0] < 1:
+                conn.executemany(
+                    "UPDATE screened_entities SET name_key = ? WHERE id = ?",
+                    [(entity_key(row["name"]), row["id"]) for row in conn.execute("SELECT id, name FROM screened_entities")]
+                )
+                conn.execute("PRAGMA user_version = 1")
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def record(self, batch_id, position, result):
+        """Replaces any earlier result of the same batch transaction, so redelivered jobs are not counted twice."""
+        screened_at = datetime.now(timezone.utc).isoformat()
+        risk_score = _as_float(result.get("Risk Score"))
+        names = result.get("Extracted Entity") or []
+        types = result.get("Entity Type") or []
+        entity_scores = result.get("Entity Risk Scores") or {}
+        with self._connect() as conn:
+            previous = conn.execute(
+                "SELECT id FROM screened_transactions WHERE batch_id = ? AND position = ?", (batch_id, position)
+            ).fetchone()
+            if previous:
+                conn.execute("DELETE FROM screened_entities WHERE screening_id = ?", (previous["id"],))
+                conn.execute("DELETE FROM screened_transactions WHERE id = ?", (previous["id"],))
+            cursor = conn.execute(
+                "INSERT INTO screened_transactions "
+                "(batch_id, position, transaction_id, risk_score, confidence_score, tiers_run, screened_at, result) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    batch_id,
+                    position,
+                    str(result.get("Transaction Id")),
+                    risk_score,
+                    _as_float(result.get("Confidence Score")),
+                    json.dumps(result.get("Tiers Run")),
+                    screened_at,
+                    json.dumps(result)
+                )
+            )
+            conn.executemany(
+                "INSERT INTO screened_entities (screening_id, name, name_key, entity_type, risk_score, screened_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                [
+                    (
+                        cursor.lastrowid,
+                        str(name),
+                        entity_key(name),
+                        types[i] if i < len(types) else None,
+                        # Per-entity scores from the cheap tier when present, else the transaction score
+                        _as_float(entity_scores.get(name, risk_score)),
+                        screened_at
+                    )
+                    for i, name in enumerate(names)
+                ]
+            )
+
+    def _page(self, conn, table, columns, filters, params, order_by, page, page_size):
+        page = max(1, page)
+        page_size = min(max(1, page_size), MAX_PAGE_SIZE)
+        where = f"WHERE {' AND '.join(filters)}" if filters else ""
+        total = conn.execute(f"SELECT COUNT(*) FROM {table} {where}", params).fetchone()[0]
+        rows = conn.execute(
+            f"SELECT {columns} FROM {table} {where} ORDER BY {order_by} LIMIT ? OFFSET ?",
+            (*params, page_size, (page - 1) * page_size)
+        ).fetchall()
+        return {"items": [dict(row) for row in rows], "page": page, "page_size": page_size, "total": total}
+
+    def list_transactions(self, page=1, page_size=50, min_risk=None, since=None, until=None, transaction_id=None):
+        filters, params = [], []
+        if transaction_id is not None:
+            filters.append("transaction_id = ?")
+            params.append(transaction_id)
+        if min_risk is not None:
+            filters.append("risk_score >= ?")
+            params.append(min_risk)
+        if since is not None:
+            filters.append("screened_at >= ?")
+            params.append(since)
+        if until is not None:
+            filters.append("screened_at < ?")
+            params.append(until)
+        with self._connect() as conn:
+            result = self._page(
+                conn, "screened_transactions",
+                "id, batch_id, transaction_id, risk_score, confidence_score, tiers_run, screened_at, result",
+                filters, params, "screened_at DESC", page, page_size
+            )
+        for item in result["items"]:
+            item["tiers_run"] = json.loads(item["tiers_run"]) if item["tiers_run"] else None
+            item["result"] = json.loads(item["result"])
+        return result
+
+    def list_entities(self, name=None, page=1, page_size=50, min_risk=None, since=None):
+        """Entity screenings, newest first. `name` matches normalised names by prefix."""
+        filters, params = [], []
+        if name:
+            # Prefix match as a range so it stays an index seek on name_key
+            key = entity_key(name)
+            if key:
+                filters.append("e.name_key >= ? AND e.name_key < ?")
+                params.extend([key, key + "\U0010ffff"])
+            else:
+                # Nothing searchable in the name (e.g. only punctuation): match nothing, not everything
+                filters.append("0")
+        if min_risk is not None:
+            filters.append("e.risk_score >= ?")
+            params.append(min_risk)
+        if since is not None:
+            filters.append("e.screened_at >= ?")
+            params.append(since)
+        with self._connect() as conn:
+            return self._page(
+                conn, "screened_entities e JOIN screened_transactions t ON t.id = e.screening_id",
+                "e.name, e.entity_type, e.risk_score, e.screened_at, t.transaction_id, t.batch_id",
+                filters, params, "e.screened_at DESC", page, page_size
+            )
+
+    def entity_summary(self, name):
+        if not entity_key(name):
+            return {"name": name, "screenings": 0, "max_risk_score": None, "last_screened_at": None}
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT COUNT(*) AS screenings, MAX(risk_score) AS max_risk_score, "
+                "MAX(screened_at) AS last_screened_at FROM screened_entities WHERE name_key = ?",
+                (entity_key(name),)
+            ).fetchone()
+        return {"name": name, **dict(row)}
@@ -0,0 +1,84 @@
+import os
+
+# Cheap-tier score below which a transaction clears without enrichment
+CLEAR_BELOW = float(os.environ.get("CASCADE_CLEAR_BELOW", 0.2))
+# Cheap-tier score above which a transaction is escalated without enrichment
+ESCALATE_ABOVE = float(os.environ.get("CASCADE_ESCALATE_ABOVE", 0.8))
+# OFAC name similarity treated as a near-exact sanctions hit
+SANCTION_MATCH_SCORE = float(os.environ.get("CASCADE_SANCTION_MATCH_SCORE", 0.95))
+CASCADE_ENABLED = os.environ.get("CASCADE_ENABLED", "1") == "1"
+
+# Weights of the cheap signals, taken from calculate_overall_risk without the wiki term
+LOCAL_WEIGHTS = {"network_risk": 0.5, "ofac_risk": 0.35}
+
+
+def local_risk_scores(entity_risks):
+    total = sum(LOCAL_WEIGHTS.values())
+    return {
+        entity: round(sum(weight * risk_data.get(key, 0) for key, weight in LOCAL_WEIGHTS.items()) / total, 3)
+        for entity, risk_data in entity_risks.items()
+    }
+
+
+def triage(local_risks):
+    """
+    Decides from the cheap tier alone. Returns ("escalate" | "clear", reason), or (None, reason)
+    when the score falls in the uncertain band and the expensive tiers have to run.
+    """
+    if not CASCADE_ENABLED:
+        return None, "Cascade disabled"
+
+    sanctioned = [
+        r for r in local_risks["ofac_results"]
+        if r.get("match_score", 0) >= SANCTION_MATCH_SCORE
+    ]
+    if sanctioned:
+        names = ", ".join(r["entity"] for r in sanctioned)
+        return "escalate", f"Near-exact OFAC sanctions match for {names}"
+
+    scores = local_risk_scores(local_risks["entity_risks"])
+    if not scores:
+        return None, "No entities extracted"
+    top_score = max(scores.values())
+    if top_score >= ESCALATE_ABOVE:
+        return "escalate", f"Local risk score {top_score} is above {ESCALATE_ABOVE}"
+
+    any_ofac_match = any(r.get("match_score", 0) > 0 for r in local_risks["ofac_results"])
+    # A low score only means "known and clean" for entities the graph actually knows; an entity
+    # found in neither the graph nor the sanctions list (e.g. a new shell company) is enriched
+    unknown = [entity for entity, risk_data in local_risks["entity_risks"].items()
+               if risk_data.get("network_entity") is None]
+    if top_score < CLEAR_BELOW and not any_ofac_match:
+        if unknown:
+            return None, f"No graph or sanctions record for {', '.join(unknown)}"
+        return "clear", f"Local risk score {top_score} is below {CLEAR_BELOW} and no OFAC candidate matched"
+
+    return None, f"Local risk score {top_score} is in the uncertain band"
+
+
+def early_exit_result(transaction, local_risks, decision, reason):
+    """
+    Builds a result in the same shape as the reasoning model's output for transactions decided
+    by the cheap tier.
+    """
+    entity_risks = local_risks["entity_risks"]
+    scores = local_risk_scores(entity_risks)
+    confidences = [
+        (risk_data.get("network_confidence", 0) + risk_data.get("ofac_confidence", 0)) / 2
+        for risk_data in entity_risks.values()
+    ]
+    if decision == "escalate":
+        risk_score = max([1.0 if r.get("match_score", 0) >= SANCTION_MATCH_SCORE else r["risk_score"]
+                          for r in local_risks["ofac_results"]] + list(scores.values()))
+    else:
+        risk_score = max(scores.values(), default=0)
+
+    return {
+        "Transaction Id": transaction.get("Transaction ID"),
+        "Extracted Entity": list(entity_risks.keys()),
+        "Entity Type": [risk_data["type"] for risk_data in entity_risks.values()],
+        "Risk Score": round(float(risk_score), 3),
+        "Supporting Evidence": ["Offshore Leaks Database", "OFAC Sanctions List"],
+        "Confidence Score": round(float(sum(confidences) / len(confidences)), 3) if confidences else 0,
+        "Reason": reason
+    }
@@ -3,17 +3,41 @@ from langchain.tools import tool, StructuredTool
 from langchain.agents import create_structured_chat_agent, AgentExecutor
 from langchain import hub
 from langchain_groq import ChatGroq
-from agenthub_tools.duckduckgo import search, news
+from langchain_core.runnables.config import run_in_executor
+
+from llm_gateway import gateway
+from tokens import estimate_tokens
+
+
+class GatewayChatGroq(ChatGroq):
+  """
+  ChatGroq whose completions go through the shared LLM gateway. Streaming is disabled so that
+  stream() (which AgentExecutor uses) falls back to _generate; async calls run it in an executor.
+  """
+
+  disable_streaming: bool = True
+
+  def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+    tokens = estimate_tokens("".join(str(m.content) for m in messages)) + (self.max_tokens or 0)
+    parent = super(GatewayChatGroq, self)._generate
+    return gateway.run(lambda: parent(messages, stop=stop, run_manager=run_manager, **kwargs),
+                       estimated_tokens=tokens)
+
+  async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+    sync_manager = run_manager.get_sync() if run_manager else None
+    return await run_in_executor(None, self._generate, messages, stop, sync_manager, **kwargs)
+
 
 def groq_entity_query(query: str) -> str:
   print(query)
   """A get request to Look about the entity on the internet to find about their political influence or business industry it is involved in"""
+  from agenthub_tools.duckduckgo import search
   content = search(query)
 #   content = DDGS().news(query)
   return content
 def chat_agent(transaction):
     search = StructuredTool.from_function(func=groq_entity_query,name="groq_entity_query",description="A get request to Look about the entity on the internet to find about their political influence or business industry it is involved in",handle_tool_error=True)
-    llm = ChatGroq(model="llama-3.3-70b-versatile",temperature=0.3,max_tokens=1000,max_retries=2,verbose=0)
+    llm = GatewayChatGroq(model="llama-3.3-70b-versatile",temperature=0.3,max_tokens=1000,max_retries=0,verbose=0)
     agent = create_structured_chat_agent(llm,tools=[search],prompt=hub.pull("hwchase17/structured-chat-agent"))
     agent_executor = AgentExecutor(agent=agent, tools=[search], verbose=True,handle_parsing_errors=True)
 
@@ -0,0 +1,174 @@
+import json
+import mmap
+import os
+import shutil
+import time
+
+import numpy as np
+from filelock import FileLock
+
+
+def _default_shared_dir():
+    # /dev/shm is a tmpfs on Linux, so every worker maps the same physical pages
+    if os.path.isdir("/dev/shm"):
+        return "/dev/shm/closedai"
+    return "./shared_artifacts"
+
+
+SHARED_DIR = os.environ.get("SHARED_ARTIFACTS_DIR", _default_shared_dir())
+# For artifacts too large to pin in RAM: mapped from disk, so the page cache can evict them
+DISK_DIR = os.environ.get("DISK_ARTIFACTS_DIR", "./shared_artifacts")
+MANIFEST = "manifest.json"
+
+
+def artifact_path(name, base_dir=SHARED_DIR):
+    return os.path.join(base_dir, name)
+
+
+def is_published(name, source_path=None, version=1, base_dir=SHARED_DIR):
+    """
+    Checks whether an artifact exists, has the expected format version and was built from the
+    current version of its source file.
+    """
+    manifest_path = os.path.join(artifact_path(name, base_dir), MANIFEST)
+    if not os.path.exists(manifest_path):
+        return False
+    with open(manifest_path, "r") as f:
+        manifest = json.load(f)
+    if manifest.get("version", 1) != version:
+        return False
+    if source_path is None:
+        return True
+    return manifest.get("source_mtime") == os.path.getmtime(source_path)
+
+
+def publish_artifact(name, build_fn, source_path=None, version=1, base_dir=SHARED_DIR):
+    """
+    Builds an artifact once per host. The first process to take the lock runs build_fn(tmp_dir),
+    every other process waits for it and then reuses the published directory.
+    """
+    os.makedirs(base_dir, exist_ok=True)
+    target = artifact_path(name, base_dir)
+    # FileLock is portable, so the backend also starts on Windows
+    with FileLock(os.path.join(base_dir, f"{name}.lock")):
+        if is_published(name, source_path, version, base_dir):
+            return target
+
+        start = time.time()
+        tmp_dir = os.path.join(base_dir, f".{name}.tmp-{os.getpid()}")
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        os.makedirs(tmp_dir)
+        build_fn(tmp_dir)
+
+        manifest = {
+            "name": name,
+            "version": version,
+            "created_at": time.time(),
+            "source_path": source_path,
+            "source_mtime": os.path.getmtime(source_path) if source_path else None,
+        }
+        with open(os.path.join(tmp_dir, MANIFEST), "w") as f:
+            json.dump(manifest, f)
+
+        # Swap the new directory in; readers that already mapped the old files keep their pages
+        if os.path.exists(target):
+            stale_dir = f"{target}.stale-{os.getpid()}"
+            os.rename(target, stale_dir)
+            os.rename(tmp_dir, target)
+            shutil.rmtree(stale_dir, ignore_errors=True)
+        else:
+            os.rename(tmp_dir, target)
+        print(f"Published shared artifact '{name}' in {time.time() - start:.1f}s")
+        return target
+
+
+def save_array(directory, key, array):
+    np.save(os.path.join(directory, f"{key}.npy"), np.ascontiguousarray(array))
+
+
+def load_array(name, key, base_dir=SHARED_DIR):
+    """Maps a published array read-only. Pages are shared between all processes on the host."""
+    return np.load(os.path.join(artifact_path(name, base_dir), f"{key}.npy"), mmap_mode="r")
+
+
+def save_strings(directory, key, values):
+    """
+    Stores a list of strings as one UTF-8 blob plus an offsets array, so it can be memory-mapped
+    without the padding of a fixed-width unicode array.
+    """
+    encoded = [("" if v is None else str(v)).encode("utf-8") for v in values]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(e) for e in encoded], out=offsets[1:])
+    with open(os.path.join(directory, f"{key}.bin"), "wb") as f:
+        for e in encoded:
+            f.write(e)
+    save_array(directory, f"{key}.offsets", offsets)
+
+
+class MappedStrings:
+    """Read-only sequence of strings backed by a memory-mapped blob."""
+
+    def __init__(self, name, key):
+        self.offsets = load_array(name, f"{key}.offsets")
+        path = os.path.join(artifact_path(name), f"{key}.bin")
+        if os.path.getsize(path) == 0:
+            self.blob = b""
+        else:
+            with open(path, "rb") as f:
+                self.blob = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, idx):
+        start, end = self.offsets[idx], self.offsets[idx + 1]
+        return self.blob[start:end].decode("utf-8")
+
+
+class MappedTable:
+    """A small read-only column store: one MappedStrings per column."""
+
+    def __init__(self, name, columns):
+        self.columns = {column: MappedStrings(name, column) for column in columns}
+
+    def __len__(self):
+        return len(next(iter(self.columns.values())))
+
+    def row(self, idx):
+        return {column: values[idx] for column, values in self.columns.items()}
+
+
+def save_keyed_embeddings(directory, keys, embeddings):
+    """
+    Stores embeddings keyed by integer ids. Keys are sorted so lookups are a binary search
+    over the mapped array instead of a per-process dict.
+    """
+    keys = np.asarray(keys, dtype=np.int64)
+    order = np.argsort(keys, kind="stable")
+    save_array(directory, "keys", keys[order])
+    save_array(directory, "embeddings", np.asarray(embeddings, dtype=np.float32)[order])
+
+
+class KeyedEmbeddings:
+    """
+    Looks up precomputed embeddings by integer key from a sidecar directory of keys.npy and
+    embeddings.npy, mapped read-only in place.
+    """
+
+    def __init__(self, directory):
+        self.keys = np.load(os.path.join(directory, "keys.npy"), mmap_mode="r")
+        self.embeddings = np.load(os.path.join(directory, "embeddings.npy"), mmap_mode="r")
+
+    def lookup(self, keys):
+        """
+        Returns (embeddings, found_mask). Rows for keys that are not present are zero.
+        """
+        keys = np.asarray(keys, dtype=np.int64)
+        result = np.zeros((len(keys), self.embeddings.shape[1]), dtype=np.float32)
+        if not len(self.keys):
+            return result, np.zeros(len(keys), dtype=bool)
+        positions = np.minimum(np.searchsorted(self.keys, keys), len(self.keys) - 1)
+        found = self.keys[positions] == keys
+        if found.any():
+            result[found] = self.embeddings[positions[found]]
+        return result, found
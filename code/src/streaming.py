@@ -1,10 +1,13 @@
 import streamlit as st
 import requests
+import time
 
 st.set_page_config(page_title="Transaction Validator", page_icon="⚠️", layout="centered")
 
 # Backend API URL (Update with actual server address if hosted)
-BACKEND_URL = "http://127.0.0.1:8000/upload"  # FastAPI backend URL
+BACKEND_BASE_URL = "http://127.0.0.1:8000"  # FastAPI backend URL
+BACKEND_URL = f"{BACKEND_BASE_URL}/upload"
+POLL_INTERVAL_SECONDS = 2
 
 # Custom styled title
 st.markdown(
@@ -16,30 +19,80 @@ st.markdown(
     unsafe_allow_html=True
 )
 
-# File uploader (accepts multiple files)
-uploaded_files = st.file_uploader("Choose files (CSV or TXT)", type=["csv", "txt"], accept_multiple_files=True)
+mode = st.sidebar.radio("Mode", ["Screen files", "Browse results"])
 
-# Submit button
-if st.button("Submit"):
-    if uploaded_files:
-        # st.info("📤 Sending files to backend...")
+if mode == "Screen files":
+    # File uploader (accepts multiple files)
+    uploaded_files = st.file_uploader("Choose files (CSV or TXT)", type=["csv", "txt"], accept_multiple_files=True)
 
-        # Prepare files for API request
-        files = [("files", (file.name, file.getvalue(), file.type)) for file in uploaded_files]
+    # Submit button
+    if st.button("Submit"):
+        if uploaded_files:
+            # st.info("📤 Sending files to backend...")
 
-        try:
-            # Send files to backend API
-            response = requests.post(BACKEND_URL, files=files)
+            # Prepare files for API request
+            files = [("files", (file.name, file.getvalue(), file.type)) for file in uploaded_files]
 
-            # Check if request was successful
-            if response.status_code == 200:
-                st.success(f"✅ {len(uploaded_files)} File(s) uploaded successfully!")
-                st.json(response.json())  # Display response from backend
-            else:
-                st.error(f"❌ Upload failed! Backend responded with: {response.status_code}")
+            try:
+                # Send files to backend API
+                response = requests.post(BACKEND_URL, files=files)
+
+                # Check if request was successful
+                if response.status_code == 200:
+                    st.success(f"✅ {len(uploaded_files)} File(s) uploaded successfully!")
+                    batch = response.json()
+                    if batch.get("status") == "queued":
+                        # Queue mode: workers screen the batch, poll until they finish
+                        with st.spinner(f"Screening batch {batch['batch_id']}..."):
+                            while batch.get("status") == "queued":
+                                time.sleep(POLL_INTERVAL_SECONDS)
+                                batch = requests.get(f"{BACKEND_BASE_URL}/batches/{batch['batch_id']}").json()
+                    st.json(batch)  # Display response from backend
+                else:
+                    st.error(f"❌ Upload failed! Backend responded with: {response.status_code}")
+
+            except requests.exceptions.RequestException as e:
+                st.error(f"❌ Error connecting to backend: {e}")
 
-        except requests.exceptions.RequestException as e:
-            st.error(f"❌ Error connecting to backend: {e}")
+        else:
+            st.error("⚠️ Please upload at least one file before submitting.")
 
-    else:
-        st.error("⚠️ Please upload at least one file before submitting.")
\ No newline at end of file
+else:
+    view = st.radio("Show", ["Transactions", "Entities"], horizontal=True)
+    name = st.text_input("Entity name (prefix)") if view == "Entities" else None
+    min_risk = st.slider("Minimum risk score", 0.0, 1.0, 0.0, 0.05)
+    since = st.date_input("Screened since", value=None)
+    page = st.number_input("Page", min_value=1, value=1, step=1)
+
+    params = {"page": page, "page_size": 50}
+    # A 0 threshold would also hide screenings that have no risk score
+    if min_risk > 0:
+        params["min_risk"] = min_risk
+    if since:
+        params["since"] = since.isoformat()
+    if name:
+        params["name"] = name
+
+    endpoint = "transactions" if view == "Transactions" else "entities"
+    try:
+        response = requests.get(f"{BACKEND_BASE_URL}/results/{endpoint}", params=params)
+        if response.status_code == 200:
+            data = response.json()
+            st.caption(f"{data['total']} record(s), page {data['page']}")
+            rows = data["items"]
+            if view == "Transactions":
+                st.dataframe([{k: v for k, v in row.items() if k != "result"} for row in rows])
+                for row in rows:
+                    with st.expander(f"{row['transaction_id']} ({row['screened_at']})"):
+                        st.json(row["result"])
+            else:
+                st.dataframe(rows)
+                if name:
+                    summary = requests.get(
+                        f"{BACKEND_BASE_URL}/results/entities/{requests.utils.quote(name, safe='')}"
+                    ).json()
+                    st.json(summary)
+        else:
+            st.error(f"❌ Backend responded with: {response.status_code}")
+    except requests.exceptions.RequestException as e:
+        st.error(f"❌ Error connecting to backend: {e}")
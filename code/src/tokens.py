@@ -0,0 +1,20 @@
+import json
+import math
+
+# Llama tokenizers average roughly four characters per token on English/JSON text
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(value):
+    """Cheap token estimate for strings or JSON-serialisable values, without loading a tokenizer."""
+    if not isinstance(value, str):
+        value = json.dumps(value, default=str, separators=(",", ":"))
+    return math.ceil(len(value) / CHARS_PER_TOKEN)
+
+
+def truncate_to_tokens(text, max_tokens):
+    text = str(text)
+    max_chars = max_tokens * CHARS_PER_TOKEN
+    if len(text) <= max_chars:
+        return text
+    return text[:max(0, max_chars - 3)].rstrip() + "..."
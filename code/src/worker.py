@@ -0,0 +1,124 @@
+import os
+import socket
+import threading
+import time
+from contextlib import contextmanager
+
+from dotenv import load_dotenv
+from sentence_transformers import SentenceTransformer
+
+from graph_db import build_driver, AsyncGraph, USE_ASYNC_GRAPH
+from job_queue import get_broker, RESULTS_QUEUE_NAME, VISIBILITY_TIMEOUT
+from llm_gateway import llm_priority
+from llm_reasoner import REASONER_BATCH_SIZE
+from network_risk import load_node_embeddings
+from ofac_risk import load_ofac_index
+from pipeline import screen_transactions
+from profiler import profile_request
+
+# Start as many of these as needed, on any host that can reach the broker and Neo4j. Workers
+# never touch the backend's stores: outcomes go back through the broker's results queue.
+POLL_INTERVAL = float(os.environ.get("WORKER_POLL_INTERVAL_SECONDS", 1))
+WORKER_ID = os.environ.get("WORKER_ID", f"{socket.gethostname()}-{os.getpid()}")
+# Reservations are extended this often, so slow LLM calls do not get a job redelivered
+HEARTBEAT_INTERVAL = float(os.environ.get("WORKER_HEARTBEAT_SECONDS", VISIBILITY_TIMEOUT / 3))
+
+
+@contextmanager
+def heartbeat(broker, jobs, settled, interval=HEARTBEAT_INTERVAL):
+    """Keeps extending the reservation of every unsettled job until the block exits."""
+    stop = threading.Event()
+
+    def beat():
+        while not stop.wait(interval):
+            for job_id in jobs.keys() - settled:
+                try:
+                    if not broker.extend(jobs[job_id]):
+                        print(f"Reservation of job {job_id} was lost, another worker may redo it")
+                except Exception as e:
+                    print(f"Heartbeat for job {job_id} failed: {e}")
+
+    thread = threading.Thread(target=beat, name="job-heartbeat", daemon=True)
+    thread.start()
+    try:
+        yield
+    finally:
+        stop.set()
+        thread.join()
+
+
+def process_jobs(broker, results_broker, driver, model, ofac_index, jobs):
+    """
+    Screens one reservation of jobs. Each outcome is reported on the results queue before the
+    job is acked; failures are retried by the broker and only reported once dead-lettered.
+    """
+    jobs = {job.job_id: job for job in jobs}
+    settled = set()
+
+    def report(job, **outcome):
+        results_broker.enqueue([{"batch_id": job.payload["batch_id"], "position": job.payload["position"], **outcome}])
+
+    def on_result(job_id, result):
+        job = jobs[job_id]
+        report(job, result=result)
+        broker.ack(job)
+        settled.add(job_id)
+
+    def on_failure(job_id, error):
+        job = jobs[job_id]
+        if broker.is_last_attempt(job):
+            # Reported first, so a crash before fail() cannot leave the transaction pending forever
+            report(job, error=error)
+            print(f"Job {job_id} dead-lettered after {job.attempts} attempt(s): {error}")
+        else:
+            print(f"Job {job_id} failed (attempt {job.attempts}), will retry: {error}")
+        broker.fail(job, error)
+        settled.add(job_id)
+
+    def on_evidence(job_id, reasoner_input, annotations):
+        broker.checkpoint(jobs[job_id], [reasoner_input, annotations])
+
+    # Evidence checkpointed by an earlier delivery of the same job
+    saved_evidence = {job_id: tuple(job.checkpoint) for job_id, job in jobs.items() if job.checkpoint}
+
+    priority = min(job.payload.get("priority", 0) for job in jobs.values())
+    # Jobs of a profiled upload carry its profile id; the whole reservation is profiled with them
+    upload_profiles = sorted({job.payload["profile_id"] for job in jobs.values() if job.payload.get("profile_id")})
+    with heartbeat(broker, jobs, settled), \
+            profile_request(bool(upload_profiles), f"worker {WORKER_ID} for {', '.join(upload_profiles)}") as profile_id:
+        if profile_id:
+            print(f"Profiling jobs of upload profile(s) {', '.join(upload_profiles)} as {profile_id}")
+        try:
+            with llm_priority(priority):
+                screen_transactions(
+                    driver, model, ofac_index,
+                    [(job_id, job.payload["transaction"]) for job_id, job in jobs.items()],
+                    on_result, on_failure, on_evidence=on_evidence, saved_evidence=saved_evidence
+                )
+        except Exception as e:
+            for job_id in jobs.keys() - settled:
+                on_failure(job_id, f"{type(e).__name__}: {e}")
+
+
+def run_worker():
+    load_dotenv()
+    password = os.environ.get('NEO4J_RISK_DB_PASSWORD')
+    driver = AsyncGraph(password=password) if USE_ASYNC_GRAPH else build_driver(password=password)
+    model = SentenceTransformer("all-MiniLM-L6-v2")
+    ofac_index = load_ofac_index("./ofac_embeddings.pkl")
+    load_node_embeddings()
+    broker = get_broker()
+    results_broker = get_broker(queue=RESULTS_QUEUE_NAME)
+    print(f"Worker {WORKER_ID} waiting for jobs...")
+
+    while True:
+        # One reasoner batch per reservation keeps the batched LLM calls full
+        jobs = broker.reserve(max_jobs=REASONER_BATCH_SIZE)
+        if not jobs:
+            time.sleep(POLL_INTERVAL)
+            continue
+        process_jobs(broker, results_broker, driver, model, ofac_index, jobs)
+
+
+if __name__ == "__main__":
+    run_worker()
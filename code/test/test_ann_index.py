@@ -0,0 +1,30 @@
+import numpy as np
+
+from ann_index import IVFInt8Index
+
+
+def normalised(rng, n, dim=32):
+    vectors = rng.standard_normal((n, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def test_search_matches_brute_force_when_probing_all_lists():
+    rng = np.random.default_rng(0)
+    vectors = normalised(rng, 500)
+    index = IVFInt8Index.build(vectors, n_lists=10)
+    assert len(index) == 500
+    assert index.codes.dtype == np.int8
+
+    for query in normalised(rng, 5):
+        ids, scores = index.search(query, vectors, k=3, nprobe=10, rerank=500)
+        expected = np.argsort(-(vectors @ query))[:3]
+        assert ids.tolist() == expected.tolist()
+        assert np.allclose(scores, vectors[expected] @ query)
+
+
+def test_search_finds_a_stored_vector_itself():
+    rng = np.random.default_rng(1)
+    vectors = normalised(rng, 1000)
+    index = IVFInt8Index.build(vectors)
+    recall = np.mean([index.search(vectors[i], vectors, k=1)[0][0] == i for i in range(0, 1000, 20)])
+    assert recall >= 0.95
@@ -0,0 +1,75 @@
+import pytest
+
+from batch_store import BatchStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    return BatchStore(db_path=str(tmp_path / "batches.db"))
+
+
+def make_batch(store, count=3, priority=0):
+    batch_id = store.create_batch(priority)
+    store.add_transactions(batch_id, [{"Transaction ID": f"T{i}"} for i in range(count)])
+    return batch_id
+
+
+def test_resume_only_reruns_unfinished_transactions(store):
+    batch_id = make_batch(store)
+    store.record_result(batch_id, 0, {"Transaction Id": "T0"})
+    store.record_failure(batch_id, 1, "boom")
+
+    assert store.finish_batch(batch_id) == "completed_with_errors"
+    assert [position for position, _ in store.pending_transactions(batch_id)] == [1, 2]
+
+    store.reset_failures(batch_id)
+    batch = store.get_batch(batch_id)
+    assert batch["counts"] == {"done": 1, "pending": 2}
+    assert batch["failures"] == []
+
+
+def test_finish_if_complete_waits_for_pending(store):
+    batch_id = make_batch(store, count=2)
+    store.record_result(batch_id, 0, {})
+    assert store.finish_if_complete(batch_id) is None
+    store.record_result(batch_id, 1, {})
+    assert store.finish_if_complete(batch_id) == "completed"
+
+
+def test_duplicate_outcomes_do_not_overwrite_done(store):
+    batch_id = make_batch(store, count=1)
+    store.record_result(batch_id, 0, {"Risk Score": 0.2})
+    store.record_result(batch_id, 0, {"Risk Score": 0.9})
+    store.record_failure(batch_id, 0, "late failure")
+
+    batch = store.get_batch(batch_id)
+    assert batch["results"] == [{"Risk Score": 0.2}]
+    assert batch["failures"] == []
+
+
+def test_evidence_is_kept_until_done(store):
+    batch_id = make_batch(store, count=2)
+    store.record_evidence(batch_id, 0, {"input": 0}, {"note": 0})
+    store.record_evidence(batch_id, 1, {"input": 1}, {"note": 1})
+    store.record_result(batch_id, 1, {})
+    assert store.saved_evidence(batch_id) == {0: ({"input": 0}, {"note": 0})}
+
+
+def test_partial_file_keeps_failed_records_for_resume(store):
+    batch_id = make_batch(store, count=1)
+    file_id = store.add_file(batch_id, "upload.txt", 10, "/nonexistent/upload.txt")
+    store.set_file_status(file_id, "partial", "1 record(s) could not be extracted", ["bad record"])
+    store.record_result(batch_id, 0, {})
+
+    assert store.finish_if_complete(batch_id) == "completed_with_errors"
+    [pending] = store.unextracted_files(batch_id)
+    assert pending["failed_records"] == ["bad record"]
+    assert store.get_batch(batch_id)["files"][0]["failed_records"] == ["bad record"]
+
+    store.set_file_status(file_id, "extracted")
+    assert store.unextracted_files(batch_id) == []
+    assert store.finish_batch(batch_id) == "completed"
+
+
+def test_priority_is_kept_with_the_batch(store):
+    assert store.get_batch(make_batch(store, priority=1))["priority"] == 1
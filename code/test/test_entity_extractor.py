@@ -0,0 +1,71 @@
+import json
+
+import pytest
+
+import entity_extractor
+
+
+def test_pack_records_never_splits_and_respects_budget():
+    records = ["a" * 40, "b" * 40, "c" * 40, "d" * 400]
+    chunks = entity_extractor.pack_records(records, budget=25)
+    assert [record for chunk in chunks for record in chunk] == records
+    # 10 tokens per short record: two fit per chunk; the oversized one gets a chunk of its own
+    assert chunks == [records[:2], records[2:3], records[3:]]
+
+
+def test_pack_records_caps_records_per_chunk():
+    chunks = entity_extractor.pack_records(["x"] * 5, budget=1000, max_records=2)
+    assert [len(chunk) for chunk in chunks] == [2, 2, 1]
+
+
+@pytest.fixture
+def llm(monkeypatch):
+    """Answers each record in the chunk, but returns truncated JSON if a record says 'bad'."""
+    calls = []
+
+    def fake_llm(chunk, filepath=None, expected_output_tokens=0, **kwargs):
+        calls.append(chunk)
+        records = chunk.split("|")
+        if any(record.startswith("bad") for record in records):
+            if "flaky" in chunk and chunk in calls[:-1]:
+                return json.dumps([{"record": r} for r in records])
+            return '[{"record": '
+        return json.dumps([{"record": r} for r in records])
+
+    monkeypatch.setattr(entity_extractor, "entity_extractor_llm", fake_llm)
+    return calls
+
+
+def test_unparseable_chunk_is_halved_and_failing_record_returned(llm):
+    entities, failed = entity_extractor.extract_chunk(["a", "b", "bad", "c"], "|".join)
+    assert [e["record"] for e in entities] == ["a", "b", "c"]
+    assert failed == ["bad"]
+    # The single failing record is retried once before giving up
+    assert llm.count("bad") == 2
+
+
+def test_single_record_succeeds_on_retry(llm):
+    entities, failed = entity_extractor.extract_chunk(["bad flaky"], "|".join)
+    assert [e["record"] for e in entities] == ["bad flaky"]
+    assert failed == []
+
+
+def test_extract_entities_collects_failures_across_chunks(llm):
+    entities, failed = entity_extractor.extract_entities([["a", "bad 1"], ["bad 2"]], "|".join)
+    assert [e["record"] for e in entities] == ["a"]
+    assert failed == ["bad 1", "bad 2"]
+
+
+def test_api_error_fails_only_that_chunk(monkeypatch):
+    import groq
+    import httpx
+
+    def flaky_llm(chunk, filepath=None, expected_output_tokens=0, **kwargs):
+        if "timeout" in chunk:
+            raise groq.APITimeoutError(request=httpx.Request("POST", "https://api.groq.com"))
+        return json.dumps([{"record": r} for r in chunk.split("|")])
+
+    monkeypatch.setattr(entity_extractor, "entity_extractor_llm", flaky_llm)
+    entities, failed = entity_extractor.extract_entities([["a", "b"], ["timeout", "c"], ["d"]], "|".join)
+    assert [e["record"] for e in entities] == ["a", "b", "d"]
+    assert failed == ["timeout", "c"]
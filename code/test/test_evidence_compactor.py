@@ -0,0 +1,56 @@
+from evidence_compactor import compact_agent, compact_evidence, compact_network, compact_ofac, _FactSet
+from tokens import estimate_tokens
+
+
+def test_agent_section_stays_in_budget_with_huge_fields():
+    transaction = {
+        "Transaction ID": "T1",
+        "Amount": "100",
+        "Notes": "n" * 100000,
+        "Entity": [{"name": f"Entity {i}", "type": "Corporation", "info": "x" * 2000} for i in range(50)],
+        "internet_info": [{"description": f"finding {i} " + "y" * 2000} for i in range(20)],
+    }
+    compacted = compact_agent(transaction, 1200, _FactSet())
+    assert estimate_tokens(compacted) <= 1200
+    assert compacted["Entity"]
+    assert compacted["internet_info"]
+
+
+def test_ofac_headers_count_against_budget():
+    results = [
+        {"entity": f"Entity {i}", "risk_score": 0.9, "confidence_score": 0.8,
+         "reason": "; ".join(f"Match {j} (Info: {'z' * 3000}) (Match Score: 0.9)" for j in range(10))}
+        for i in range(100)
+    ]
+    compacted = compact_ofac(results, 600, _FactSet())
+    assert estimate_tokens(compacted) <= 600
+    assert 0 < len(compacted) < 100
+
+
+def test_network_relationships_are_ranked_by_depth_and_omissions_counted():
+    results = [{
+        "name": "Acme",
+        "relationships_summary": [f"Acme owns Company {i} (Depth: {3 - i % 3})" for i in range(200)],
+    }]
+    [entity] = compact_network(results, 300, _FactSet())
+    assert all("Depth: 1" in r for r in entity["relationships"])
+    assert entity["relationships_omitted"] == 200 - len(entity["relationships"])
+
+
+def test_facts_are_not_repeated_across_sources():
+    fact = "Acme Ltd is sanctioned"
+    evidence = compact_evidence(
+        {"Transaction ID": "T1", "Entity": [], "internet_info": [{"description": fact}]},
+        [],
+        [{"name": "Acme", "relationships_summary": [fact]}],
+        [],
+    )
+    assert evidence["agent"]["internet_info"] == [fact]
+    assert evidence["network"][0]["relationships"] == []
+
+
+def test_fact_that_does_not_fit_is_not_marked_seen():
+    facts = _FactSet()
+    long_fact = "w" * 400
+    compact_network([{"name": "A", "relationships_summary": [long_fact]}], 40, facts)
+    assert long_fact not in facts
@@ -0,0 +1,88 @@
+import time
+
+import pytest
+
+import job_queue
+from job_queue import Broker, SQLiteBroker
+
+
+@pytest.fixture
+def broker(tmp_path):
+    return SQLiteBroker(db_path=str(tmp_path / "queue.db"), queue="test")
+
+
+def test_broker_is_abstract():
+    with pytest.raises(TypeError):
+        Broker()
+
+
+def test_reserved_jobs_are_invisible_until_acked(broker):
+    broker.enqueue([{"n": 1}, {"n": 2}])
+    jobs = broker.reserve(max_jobs=5)
+    assert [job.payload["n"] for job in jobs] == [1, 2]
+    assert all(job.attempts == 1 for job in jobs)
+    assert broker.reserve(max_jobs=5) == []
+
+    for job in jobs:
+        broker.ack(job)
+    assert broker.stats()["ready"] == 0
+    assert broker.stats()["reserved_or_delayed"] == 0
+
+
+def test_expired_reservation_is_redelivered_and_stale_ack_ignored(broker):
+    broker.enqueue([{"n": 1}])
+    [first] = broker.reserve(visibility_timeout=0.05)
+    time.sleep(0.1)
+    [second] = broker.reserve(visibility_timeout=60)
+    assert second.job_id == first.job_id
+    assert second.attempts == 2
+    assert second.receipt != first.receipt
+
+    # The first worker lost its reservation: its ack, extend and checkpoint are ignored
+    broker.ack(first)
+    assert not broker.extend(first)
+    broker.checkpoint(first, {"stale": True})
+    assert broker.stats()["reserved_or_delayed"] == 1
+
+    broker.ack(second)
+    assert broker.stats()["reserved_or_delayed"] == 0
+
+
+def test_extend_keeps_job_reserved(broker):
+    broker.enqueue([{"n": 1}])
+    [job] = broker.reserve(visibility_timeout=0.1)
+    assert broker.extend(job, visibility_timeout=60)
+    time.sleep(0.15)
+    assert broker.reserve() == []
+
+
+def test_checkpoint_survives_redelivery(broker):
+    broker.enqueue([{"n": 1}])
+    [job] = broker.reserve(visibility_timeout=0.05)
+    assert job.checkpoint is None
+    broker.checkpoint(job, [{"input": 1}, {"note": "x"}])
+    time.sleep(0.1)
+    [again] = broker.reserve()
+    assert again.checkpoint == [{"input": 1}, {"note": "x"}]
+
+
+def test_failed_job_is_retried_then_dead_lettered(broker, monkeypatch):
+    monkeypatch.setattr(job_queue, "RETRY_DELAY", 0)
+    monkeypatch.setattr(job_queue, "MAX_ATTEMPTS", 2)
+    broker.enqueue([{"n": 1}])
+
+    [job] = broker.reserve()
+    assert not broker.is_last_attempt(job)
+    assert broker.fail(job, "boom") is False
+
+    [job] = broker.reserve()
+    assert broker.is_last_attempt(job)
+    assert broker.fail(job, "boom again") is True
+    assert broker.reserve() == []
+    assert broker.stats()["dead"] == 1
+
+
+def test_jobs_are_reserved_by_priority_then_in_order(broker):
+    broker.enqueue([{"n": 1, "priority": 1}, {"n": 2, "priority": 1}])
+    broker.enqueue([{"n": 3, "priority": 0}])
+    assert [job.payload["n"] for job in broker.reserve(max_jobs=2)] == [3, 1]
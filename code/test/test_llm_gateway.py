@@ -0,0 +1,66 @@
+import os
+import threading
+import time
+
+import llm_gateway
+from llm_gateway import BULK, INTERACTIVE, YIELD_SECONDS, LLMGateway, LocalLimiter, SQLiteLimiter, _take
+
+
+def test_limiter_is_created_on_first_use(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    gateway = LLMGateway()
+    assert os.listdir(tmp_path) == []
+    monkeypatch.setattr(llm_gateway, "build_limiter", lambda: LocalLimiter({"requests": 60, "tokens": 1000}))
+    assert gateway.run(lambda: 42) == 42
+
+
+class SlowLimiter(LocalLimiter):
+    def try_take(self, amounts, *args):
+        time.sleep(0.5)
+        return super().try_take(amounts, *args)
+
+
+def test_slow_limiter_does_not_block_stats():
+    gateway = LLMGateway(SlowLimiter({"requests": 60, "tokens": 1000}))
+    caller = threading.Thread(target=gateway.run, args=(lambda: None,))
+    caller.start()
+    time.sleep(0.1)
+    started = time.monotonic()
+    assert gateway.stats()["queue_depth"] == 1
+    assert time.monotonic() - started < 0.2
+    caller.join()
+
+
+def test_sqlite_limiter_is_shared_between_instances(tmp_path):
+    limits = {"requests": 60, "tokens": 1000}
+    first = SQLiteLimiter(limits, db_path=str(tmp_path / "limiter.db"))
+    second = SQLiteLimiter(limits, db_path=str(tmp_path / "limiter.db"))
+    assert first.try_take({"requests": 1, "tokens": 900}) == 0
+    assert second.try_take({"requests": 1, "tokens": 900}) > 40
+    second.pause(5)
+    assert first.try_take({"requests": 1, "tokens": 1}) > 4
+
+
+def test_bulk_callers_yield_to_interactive_waiters():
+    limits = {"requests": 60, "tokens": 1000}
+    wait, state = _take({}, {"requests": 1, "tokens": 1000}, limits, 0, BULK, "bulk")
+    assert wait == 0
+
+    # The interactive caller has to wait for tokens and is registered as waiting
+    wait, state = _take(state, {"requests": 1, "tokens": 10}, limits, 0, INTERACTIVE, "interactive")
+    assert wait > 0
+    # A second later there are tokens again, but bulk yields while the interactive caller waits
+    wait, state = _take(state, {"requests": 1, "tokens": 1}, limits, 1, BULK, "bulk")
+    assert wait == YIELD_SECONDS
+    wait, state = _take(state, {"requests": 1, "tokens": 10}, limits, 1, INTERACTIVE, "interactive")
+    assert wait == 0
+    wait, state = _take(state, {"requests": 1, "tokens": 1}, limits, 1, BULK, "bulk")
+    assert wait == 0
+
+
+def test_crashed_waiters_expire():
+    limits = {"requests": 60, "tokens": 1000}
+    _, state = _take({}, {"requests": 1, "tokens": 1000}, limits, 0, BULK, "bulk")
+    _, state = _take(state, {"requests": 1, "tokens": 10}, limits, 0, INTERACTIVE, "gone")
+    wait, _ = _take(state, {"requests": 1, "tokens": 1}, limits, 60, BULK, "bulk")
+    assert wait == 0
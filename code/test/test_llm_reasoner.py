@@ -0,0 +1,25 @@
+import json
+
+import llm_reasoner
+
+
+def _result(key):
+    return {"Transaction Id": key, "Extracted Entity": [], "Entity Type": [], "Risk Score": 0.1,
+            "Supporting Evidence": [], "Confidence Score": 0.9, "Reason": "test"}
+
+
+def test_batch_uses_json_mode_and_retries_missing_keys_alone(monkeypatch):
+    calls = []
+
+    def fake_llm(chunk, filepath=None, response_format=None, **kwargs):
+        calls.append(response_format)
+        if response_format:
+            # The batched answer leaves out transaction 2
+            return json.dumps({"1": _result("1")})
+        return json.dumps(_result("2"))
+
+    monkeypatch.setattr(llm_reasoner, "entity_extractor_llm", fake_llm)
+    results, failures = llm_reasoner.llm_reasoner_batch({1: "evidence 1", 2: "evidence 2"})
+    assert calls[0] == {"type": "json_object"}
+    assert calls[-1] is None
+    assert set(results) == {1, 2} and not failures
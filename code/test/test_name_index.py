@@ -0,0 +1,35 @@
+import numpy as np
+
+from name_index import NgramIndex, name_ngrams, normalize_name
+
+
+def test_normalize_name_strips_accents_and_punctuation():
+    assert normalize_name("  José  O'Neill-Díaz ") == "jose o neill diaz"
+
+
+def test_name_ngrams_are_unique_and_sorted():
+    grams = name_ngrams("abab")
+    assert len(grams) == len(set(grams.tolist()))
+    assert np.all(np.diff(grams) > 0)
+
+
+def test_overlap_ranks_closest_name_first():
+    names = ["Vladimir Petrov", "Acme Trading LLC", "Vladimir Petrova", "Banco Nacional"]
+    index = NgramIndex.build(names)
+    assert len(index) == len(names)
+
+    rows, dice = index.overlap("vladimir petrov")
+    assert rows[np.argmax(dice)] == 0
+    assert dice[rows.tolist().index(0)] == 1.0
+    assert 1 not in rows.tolist() or dice[rows.tolist().index(1)] < 0.3
+
+
+def test_overlap_without_shared_grams_is_empty():
+    rows, dice = NgramIndex.build(["abc"]).overlap("xyz")
+    assert len(rows) == 0 and len(dice) == 0
+
+
+def test_frequent_grams_are_skipped():
+    index = NgramIndex.build(["smith a", "smith b", "smith c"])
+    rows, _ = index.overlap("smith", max_postings=2)
+    assert len(rows) == 0
@@ -0,0 +1,29 @@
+import numpy as np
+
+import network_risk
+
+
+def test_sidecar_is_mapped_in_place(tmp_path, monkeypatch):
+    np.save(tmp_path / "keys.npy", np.array([3, 7, 11], dtype=np.int64))
+    np.save(tmp_path / "embeddings.npy", np.eye(3, dtype=np.float32))
+    monkeypatch.setattr(network_risk, "NODE_EMBEDDINGS_DIR", str(tmp_path))
+    network_risk.load_node_embeddings.cache_clear()
+    try:
+        sidecar = network_risk.load_node_embeddings()
+        assert isinstance(sidecar.embeddings, np.memmap)
+        assert sidecar.embeddings.filename == str(tmp_path / "embeddings.npy")
+
+        embeddings, found = sidecar.lookup([7, 5, 11])
+        assert found.tolist() == [True, False, True]
+        assert embeddings.tolist() == [[0, 1, 0], [0, 0, 0], [0, 0, 1]]
+    finally:
+        network_risk.load_node_embeddings.cache_clear()
+
+
+def test_missing_sidecar_returns_none(tmp_path, monkeypatch):
+    monkeypatch.setattr(network_risk, "NODE_EMBEDDINGS_DIR", str(tmp_path))
+    network_risk.load_node_embeddings.cache_clear()
+    try:
+        assert network_risk.load_node_embeddings() is None
+    finally:
+        network_risk.load_node_embeddings.cache_clear()
@@ -0,0 +1,37 @@
+import json
+import threading
+import time
+
+import profiler
+
+
+def busy_helper_work(seconds):
+    end = time.monotonic() + seconds
+    while time.monotonic() < end:
+        pass
+
+
+def test_work_on_other_threads_is_sampled(tmp_path, monkeypatch):
+    monkeypatch.setattr(profiler, "PROFILE_DIR", str(tmp_path))
+    with profiler.profile_request(True, "test") as profile_id:
+        helper = threading.Thread(target=busy_helper_work, args=(0.3,), name="helper")
+        helper.start()
+        helper.join()
+
+    with open(profiler.profile_path(profile_id, "summary")) as f:
+        summary = json.load(f)
+    assert summary["threads"]["helper"] > 0
+    assert any(frame["function"] == "busy_helper_work" and frame["thread"] == "helper"
+               for frame in summary["top_inclusive"])
+
+    with open(profiler.profile_path(profile_id, "speedscope")) as f:
+        speedscope = json.load(f)
+    assert any(profile["name"].endswith("[helper]") for profile in speedscope["profiles"])
+
+
+def test_disabled_profile_writes_nothing(tmp_path, monkeypatch):
+    monkeypatch.setattr(profiler, "PROFILE_DIR", str(tmp_path))
+    with profiler.profile_request(False) as profile_id:
+        pass
+    assert profile_id is None
+    assert list(tmp_path.iterdir()) == []
@@ -0,0 +1,34 @@
+from results_store import ResultsStore
+
+
+def test_record_replaces_earlier_result_of_same_position(tmp_path):
+    store = ResultsStore(db_path=str(tmp_path / "results.db"))
+    result = {"Transaction Id": "T1", "Risk Score": 0.5, "Extracted Entity": ["Acme Ltd"]}
+    store.record("batch", 0, result)
+    store.record("batch", 0, {**result, "Risk Score": 0.7})
+    store.record("batch", 1, {**result, "Transaction Id": "T2"})
+
+    transactions = store.list_transactions()
+    assert transactions["total"] == 2
+    assert sorted(item["risk_score"] for item in transactions["items"]) == [0.5, 0.7]
+    assert store.list_entities()["total"] == 2
+
+
+def test_non_latin_names_are_not_merged(tmp_path):
+    store = ResultsStore(db_path=str(tmp_path / "results.db"))
+    store.record("batch", 0, {"Transaction Id": "T1", "Risk Score": 0.9, "Extracted Entity": ["李明"]})
+    store.record("batch", 1, {"Transaction Id": "T2", "Risk Score": 0.1, "Extracted Entity": ["王芳"]})
+    store.record("batch", 2, {"Transaction Id": "T3", "Risk Score": 0.5, "Extracted Entity": ["Ｍüller GmbH"]})
+
+    assert store.entity_summary("李明")["screenings"] == 1
+    assert store.entity_summary("李明")["max_risk_score"] == 0.9
+    assert [item["name"] for item in store.list_entities(name="王")["items"]] == ["王芳"]
+    # Full-width and case variants share a key
+    assert store.entity_summary("MÜLLER gmbh")["screenings"] == 1
+
+
+def test_names_without_searchable_characters_match_nothing(tmp_path):
+    store = ResultsStore(db_path=str(tmp_path / "results.db"))
+    store.record("batch", 0, {"Transaction Id": "T1", "Risk Score": 0.9, "Extracted Entity": ["Acme"]})
+    assert store.list_entities(name="---")["total"] == 0
+    assert store.entity_summary("?!")["screenings"] == 0
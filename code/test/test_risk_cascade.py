@@ -0,0 +1,25 @@
+from risk_cascade import triage
+
+
+def local_risks(network_entity, network_risk=0.05, match_score=0):
+    return {
+        "entity_risks": {"Acme Ltd": {"type": "Corporation", "network_entity": network_entity,
+                                      "network_risk": network_risk, "ofac_risk": 0}},
+        "ofac_results": [{"entity": "Acme Ltd", "match_score": match_score, "risk_score": 0}],
+    }
+
+
+def test_known_clean_entity_is_cleared():
+    decision, _ = triage(local_risks("ACME LTD"))
+    assert decision == "clear"
+
+
+def test_entity_unknown_to_graph_and_sanctions_is_enriched():
+    decision, reason = triage(local_risks(None))
+    assert decision is None
+    assert "Acme Ltd" in reason
+
+
+def test_near_exact_sanctions_match_escalates_even_if_unknown_to_graph():
+    decision, _ = triage(local_risks(None, match_score=0.99))
+    assert decision == "escalate"
@@ -0,0 +1,40 @@
+from langchain.agents import AgentExecutor, create_structured_chat_agent
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.tools import StructuredTool
+from langchain_groq import ChatGroq
+
+import search_agent
+
+PROMPT = ChatPromptTemplate.from_messages([
+    ("system", "Tools: {tools}\nNames: {tool_names}"),
+    ("human", "{input}\n\n{agent_scratchpad}"),
+])
+FINAL_ANSWER = '```json\n{"action": "Final Answer", "action_input": "Acme Ltd is a trading company"}\n```'
+
+
+class RecordingGateway:
+    def __init__(self):
+        self.calls = []
+
+    def run(self, fn, estimated_tokens=1, **kwargs):
+        self.calls.append(estimated_tokens)
+        return fn()
+
+
+def test_agent_executor_completions_go_through_gateway(monkeypatch):
+    gateway = RecordingGateway()
+    monkeypatch.setattr(search_agent, "gateway", gateway)
+    # The Groq API itself is replaced; everything above it is the real agent stack
+    monkeypatch.setattr(ChatGroq, "_generate", lambda self, messages, stop=None, run_manager=None, **kwargs:
+                        ChatResult(generations=[ChatGeneration(message=AIMessage(content=FINAL_ANSWER))]))
+
+    llm = search_agent.GatewayChatGroq(model="llama-3.3-70b-versatile", api_key="test", max_tokens=100, max_retries=0)
+    tool = StructuredTool.from_function(func=lambda query: "", name="lookup", description="Looks up an entity")
+    agent = create_structured_chat_agent(llm, tools=[tool], prompt=PROMPT)
+    result = AgentExecutor(agent=agent, tools=[tool]).invoke({"input": "Tell me about Acme Ltd"})
+
+    assert result["output"] == "Acme Ltd is a trading company"
+    assert len(gateway.calls) == 1
+    assert gateway.calls[0] > 100